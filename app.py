@@ -1,536 +1,1390 @@
-# app.py
-import os
-import sys
-import uuid  # 添加uuid导入
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
-
-# 添加当前目录到 Python 路径
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-
-# 先创建app实例
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'dev-key-12345-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///dating_app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# 初始化扩展
-from flask_sqlalchemy import SQLAlchemy
-
-db = SQLAlchemy(app)
-
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
-login_manager.login_message = '请先登录以访问此页面。'
-
-
-# 定义模型（修复UUID生成）
-class User(db.Model):
-    __tablename__ = 'users'
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # 修复这里
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_login = db.Column(db.DateTime, default=datetime.utcnow)
-
-    profile = db.relationship('UserProfile', backref='user', uselist=False, cascade='all, delete-orphan')
-
-    def get_id(self):
-        return self.id
-
-    def is_authenticated(self):
-        return True
-
-    def is_active(self):
-        return True
-
-    def is_anonymous(self):
-        return False
-
-
-class UserProfile(db.Model):
-    __tablename__ = 'user_profiles'
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # 修复这里
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-
-    full_name = db.Column(db.String(100))
-    age = db.Column(db.Integer)
-    gender = db.Column(db.String(20))
-    bio = db.Column(db.Text)
-
-    latitude = db.Column(db.Float)
-    longitude = db.Column(db.Float)
-    location_visible = db.Column(db.Boolean, default=True)
-
-    phone = db.Column(db.String(20))
-    wechat = db.Column(db.String(50))
-    contact_visible = db.Column(db.Boolean, default=False)
-
-    profile_visible = db.Column(db.Boolean, default=True)
-    virtual_partner_preference = db.Column(db.Text)
-
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-    def to_dict(self, include_private=False):
-        data = {
-            'id': self.id,
-            'user_id': self.user_id,
-            'full_name': self.full_name or '未设置',
-            'age': self.age or '未设置',
-            'gender': self.gender or '未设置',
-            'bio': self.bio or '暂无简介',
-        }
-
-        if include_private or self.profile_visible:
-            if include_private or self.location_visible:
-                data.update({
-                    'latitude': self.latitude,
-                    'longitude': self.longitude
-                })
-
-            if include_private or self.contact_visible:
-                data.update({
-                    'phone': self.phone,
-                    'wechat': self.wechat
-                })
-
-        return data
-
-
-class Match(db.Model):
-    __tablename__ = 'matches'
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # 修复这里
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-    matched_user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-
-    status = db.Column(db.String(20), default='pending')
-    contact_exchanged = db.Column(db.Boolean, default=False)
-    contact_exchange_requested = db.Column(db.Boolean, default=False)
-
-    is_virtual_partner = db.Column(db.Boolean, default=False)
-    virtual_partner_start = db.Column(db.DateTime)
-    virtual_partner_end = db.Column(db.DateTime)
-
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-
-# 工具函数
-def validate_email(email):
-    import re
-    if not email:
-        return False
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-
-def validate_password(password):
-    import re
-    if not password or len(password) < 8:
-        return False
-    if not re.search(r'[A-Za-z]', password):
-        return False
-    if not re.search(r'\d', password):
-        return False
-    return True
-
-
-def calculate_distance(lat1, lon1, lat2, lon2):
-    from math import radians, sin, cos, sqrt, atan2
-    if not all([lat1, lon1, lat2, lon2]):
-        return float('inf')
-
-    R = 6371
-    lat1_rad = radians(lat1)
-    lon1_rad = radians(lon1)
-    lat2_rad = radians(lat2)
-    lon2_rad = radians(lon2)
-
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
-
-    a = sin(dlat / 2) ** 2 + cos(lat1_rad) * cos(lat2_rad) * sin(dlon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-
-    return R * c
-
-
-def find_potential_matches(user, virtual_partner=False, max_results=20):
-    """简化版匹配算法"""
-    try:
-        # 获取所有可见用户
-        other_profiles = UserProfile.query.filter(
-            UserProfile.user_id != user.id,
-            UserProfile.profile_visible == True
-        ).limit(max_results).all()
-
-        matches = []
-        for profile in other_profiles:
-            match_data = profile.to_dict()
-            match_data['match_score'] = 50  # 基础分数
-
-            # 简单计算距离
-            if (user.profile.latitude and user.profile.longitude and
-                    profile.latitude and profile.longitude):
-                distance = calculate_distance(
-                    user.profile.latitude, user.profile.longitude,
-                    profile.latitude, profile.longitude
-                )
-                match_data['distance'] = round(distance, 2)
-
-            matches.append(match_data)
-
-        return matches
-    except Exception as e:
-        print(f"匹配算法错误: {e}")
-        return []
-
-
-@login_manager.user_loader
-def load_user(user_id):
-    return db.session.get(User, user_id)
-
-
-# 创建数据库表
-def create_tables():
-    with app.app_context():
-        try:
-            db.create_all()
-            print("✅ 数据库表创建成功！")
-
-            # 创建测试用户
-            if User.query.count() == 0:
-                create_test_users()
-
-        except Exception as e:
-            print(f"❌ 数据库创建失败: {e}")
-
-
-def create_test_users():
-    """创建测试用户"""
-    try:
-        # 测试用户1
-        user1 = User(
-            username="demo",
-            email="demo@example.com",
-            password_hash=generate_password_hash("password123")
-        )
-        db.session.add(user1)
-        db.session.commit()  # 先提交获取ID
-
-        profile1 = UserProfile(
-            user_id=user1.id,
-            full_name="演示用户",
-            age=25,
-            gender="男",
-            bio="这是一个演示用户账号",
-            latitude=39.9042,
-            longitude=116.4074
-        )
-        db.session.add(profile1)
-
-        # 测试用户2
-        user2 = User(
-            username="test",
-            email="test@example.com",
-            password_hash=generate_password_hash("password123")
-        )
-        db.session.add(user2)
-        db.session.commit()  # 先提交获取ID
-
-        profile2 = UserProfile(
-            user_id=user2.id,
-            full_name="测试用户",
-            age=23,
-            gender="女",
-            bio="喜欢旅行和阅读",
-            latitude=39.9163,
-            longitude=116.3972
-        )
-        db.session.add(profile2)
-
-        db.session.commit()
-        print("✅ 测试用户创建成功！")
-
-    except Exception as e:
-        db.session.rollback()
-        print(f"❌ 创建测试用户失败: {e}")
-
-
-# 路由定义
-@app.route('/')
-def index():
-    return redirect(url_for('home'))
-
-
-@app.route('/home')
-def home():
-    return render_template('home.html')
-
-# 添加缺失的路由
-@app.route('/messages')
-@login_required
-def messages():
-    """消息页面"""
-    return render_template('messages.html')
-
-@app.route('/settings')
-@login_required
-def settings():
-    """设置页面"""
-    return render_template('settings.html')
-
-
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-
-    if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
-
-        if not username or not password:
-            flash('请输入用户名和密码', 'error')
-            return render_template('login.html')
-
-        user = User.query.filter_by(username=username).first()
-
-        if user and check_password_hash(user.password_hash, password):
-            login_user(user)
-            user.last_login = datetime.utcnow()
-            db.session.commit()
-            flash('登录成功！', 'success')
-            return redirect(url_for('dashboard'))
-        else:
-            flash('用户名或密码错误', 'error')
-
-    return render_template('login.html')
-
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-
-    if request.method == 'POST':
-        username = request.form.get('username')
-        email = request.form.get('email')
-        password = request.form.get('password')
-        confirm_password = request.form.get('confirm_password')
-
-        if not all([username, email, password, confirm_password]):
-            flash('请填写所有必填字段', 'error')
-            return render_template('register.html')
-
-        if password != confirm_password:
-            flash('两次输入的密码不一致', 'error')
-            return render_template('register.html')
-
-        if not validate_email(email):
-            flash('邮箱格式不正确', 'error')
-            return render_template('register.html')
-
-        if not validate_password(password):
-            flash('密码必须包含字母和数字，且长度至少8位', 'error')
-            return render_template('register.html')
-
-        if User.query.filter_by(username=username).first():
-            flash('用户名已存在', 'error')
-            return render_template('register.html')
-
-        if User.query.filter_by(email=email).first():
-            flash('邮箱已被注册', 'error')
-            return render_template('register.html')
-
-        try:
-            new_user = User(
-                username=username,
-                email=email,
-                password_hash=generate_password_hash(password)
-            )
-            db.session.add(new_user)
-            db.session.commit()  # 先提交获取ID
-
-            profile = UserProfile(user_id=new_user.id)
-            db.session.add(profile)
-            db.session.commit()
-
-            flash('注册成功，请登录', 'success')
-            return redirect(url_for('login'))
-        except Exception as e:
-            db.session.rollback()
-            flash('注册失败，请稍后重试', 'error')
-            print(f"注册错误: {e}")
-
-    return render_template('register.html')
-
-
-@app.route('/logout')
-@login_required
-def logout():
-    logout_user()
-    flash('您已成功退出登录', 'success')
-    return redirect(url_for('home'))
-
-
-@app.route('/dashboard')
-@login_required
-def dashboard():
-    # 确保用户有个人资料
-    if not hasattr(current_user, 'profile'):
-        profile = UserProfile(user_id=current_user.id)
-        db.session.add(profile)
-        db.session.commit()
-
-    pending_requests = 0  # 简化版本
-    return render_template('dashboard.html', user=current_user, pending_requests=pending_requests)
-
-
-@app.route('/nearby')
-@login_required
-def nearby_people():
-    user_profile = current_user.profile
-
-    if not user_profile.latitude or not user_profile.longitude:
-        flash('请先设置您的位置信息', 'warning')
-        return redirect(url_for('edit_profile'))
-
-    try:
-        all_profiles = UserProfile.query.filter(
-            UserProfile.user_id != current_user.id,
-            UserProfile.profile_visible == True,
-            UserProfile.location_visible == True
-        ).all()
-
-        nearby_users = []
-        for profile in all_profiles:
-            if profile.latitude and profile.longitude:
-                distance = calculate_distance(
-                    user_profile.latitude, user_profile.longitude,
-                    profile.latitude, profile.longitude
-                )
-
-                if distance <= 50:
-                    user_data = profile.to_dict()
-                    user_data['distance'] = round(distance, 2)
-                    nearby_users.append(user_data)
-
-        nearby_users.sort(key=lambda x: x['distance'])
-        return render_template('nearby.html', nearby_users=nearby_users)
-    except Exception as e:
-        flash('获取附近用户失败', 'error')
-        print(f"附近用户错误: {e}")
-        return render_template('nearby.html', nearby_users=[])
-
-
-@app.route('/matching')
-@login_required
-def matching():
-    try:
-        potential_matches = find_potential_matches(current_user)
-        return render_template('matching.html', potential_matches=potential_matches)
-    except Exception as e:
-        flash('匹配功能暂时不可用', 'error')
-        print(f"匹配错误: {e}")
-        return render_template('matching.html', potential_matches=[])
-
-
-@app.route('/send_match_request/<user_id>', methods=['POST'])
-@login_required
-def send_match_request(user_id):
-    try:
-        return jsonify({'success': True, 'message': '匹配请求已发送（演示功能）'})
-    except Exception as e:
-        return jsonify({'success': False, 'message': '发送失败'})
-
-
-@app.route('/virtual_partner')
-@login_required
-def virtual_partner():
-    return render_template('virtual_partner.html', current_partner=None, recommendations=[])
-
-
-@app.route('/profile')
-@login_required
-def profile():
-    # 确保有个人资料
-    if not hasattr(current_user, 'profile'):
-        profile = UserProfile(user_id=current_user.id)
-        db.session.add(profile)
-        db.session.commit()
-
-    return render_template('profile.html', profile=current_user.profile)
-
-
-@app.route('/edit_profile', methods=['GET', 'POST'])
-@login_required
-def edit_profile():
-    # 确保有个人资料
-    if not hasattr(current_user, 'profile'):
-        profile = UserProfile(user_id=current_user.id)
-        db.session.add(profile)
-        db.session.commit()
-
-    profile = current_user.profile
-
-    if request.method == 'POST':
-        try:
-            profile.full_name = request.form.get('full_name', '').strip() or None
-            profile.bio = request.form.get('bio', '').strip() or None
-            profile.gender = request.form.get('gender', '').strip() or None
-
-            age_str = request.form.get('age', '').strip()
-            profile.age = int(age_str) if age_str and age_str.isdigit() else None
-
-            lat_str = request.form.get('latitude', '').strip()
-            lon_str = request.form.get('longitude', '').strip()
-            profile.latitude = float(lat_str) if lat_str else None
-            profile.longitude = float(lon_str) if lon_str else None
-
-            profile.phone = request.form.get('phone', '').strip() or None
-            profile.wechat = request.form.get('wechat', '').strip() or None
-
-            profile.profile_visible = 'profile_visible' in request.form
-            profile.location_visible = 'location_visible' in request.form
-            profile.contact_visible = 'contact_visible' in request.form
-
-            db.session.commit()
-            flash('个人资料已更新', 'success')
-            return redirect(url_for('profile'))
-        except Exception as e:
-            db.session.rollback()
-            flash('更新失败，请检查输入数据', 'error')
-            print(f"更新资料错误: {e}")
-
-    return render_template('edit_profile.html', profile=profile)
-
-
-# 错误处理
-@app.errorhandler(404)
-def not_found_error(error):
-    return render_template('404.html'), 404
-
-
-@app.errorhandler(500)
-def internal_error(error):
-    db.session.rollback()
-    return render_template('500.html'), 500
-
-
-if __name__ == '__main__':
-    create_tables()
-
-    print("=" * 50)
-    print("🎉 交友平台启动成功！")
-    print("📍 访问地址: http://127.0.0.1:5000")
-    print("👤 测试账号: demo / password123")
-    print("👤 测试账号: test / password123")
-    print("=" * 50)
-
+# app.py
+import json
+import os
+import sys
+import time
+import uuid  # 添加uuid导入
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import hmac
+
+import click
+from flask import Flask, Response, abort, render_template, request, jsonify, redirect, url_for, flash
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from datetime import datetime
+
+# 添加当前目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bulk_import import prepare_batch, read_batches, read_records
+from config import Config
+from login_tracker import LastLoginBuffer
+from passwords import ThrottledPasswordHasher
+from instrumentation import RequestInstrumentation
+from geolocation import encode_geohash
+from match_cache import MatchCache, PendingRequestCounts
+from message_broker import MessageBroker
+from pagination import (datetime_to_sort_value, decode_cursor, encode_cursor, parse_positive_number,
+                        sort_value_to_datetime)
+from profile_store import ProfileStore
+import schema
+from recommendations import ProfileRow, build_neighborhoods, neighborhood_key, score_neighborhood
+
+# 先创建app实例
+app = Flask(__name__)
+app.config.from_object(Config)
+
+# 初始化扩展
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, func, insert, literal, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+
+db = SQLAlchemy(app)
+
+with app.app_context():
+    schema.configure_sqlite(db.engine, app.config['SQLITE_PRAGMAS'])
+
+login_manager = LoginManager()
+login_manager.init_app(app)
+login_manager.login_view = 'login'
+login_manager.login_message = '请先登录以访问此页面。'
+
+# 匹配推荐缓存
+match_cache = MatchCache(max_size=app.config['MATCH_CACHE_SIZE'], ttl=app.config['MATCH_CACHE_TTL'])
+
+# 私信和通知的进程内推送，/api/events 的每个长连接是一个订阅
+message_broker = MessageBroker(max_queue=app.config['EVENT_STREAM_QUEUE_SIZE'])
+
+# 请求级性能统计，INSTRUMENTATION_ENABLED 打开时才注册钩子
+request_instrumentation = None
+if app.config['INSTRUMENTATION_ENABLED']:
+    with app.app_context():
+        request_instrumentation = RequestInstrumentation(
+            app, db.engine, slow_request_ms=app.config['SLOW_REQUEST_MS'])
+
+# 附近的人搜索半径（公里）
+NEARBY_RADIUS_KM = 50
+# 匹配推荐的候选范围（公里），超过100公里距离不再加分
+MATCH_RADIUS_KM = 100
+
+
+# 定义模型（修复UUID生成）
+class User(db.Model):
+    __tablename__ = 'users'
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # 修复这里
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(128), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_login = db.Column(db.DateTime, default=datetime.utcnow)
+
+    profile = db.relationship('UserProfile', backref='user', uselist=False, cascade='all, delete-orphan')
+
+    def get_id(self):
+        return self.id
+
+    def is_authenticated(self):
+        return True
+
+    def is_active(self):
+        return True
+
+    def is_anonymous(self):
+        return False
+
+
+class UserProfile(db.Model):
+    __tablename__ = 'user_profiles'
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # 修复这里
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+
+    full_name = db.Column(db.String(100))
+    age = db.Column(db.Integer)
+    gender = db.Column(db.String(20))
+    bio = db.Column(db.Text)
+    city = db.Column(db.String(50), index=True)  # Streamlit 前端按城市查找附近的人
+    interests_mask = db.Column(db.Integer, default=0)  # 兴趣位集，见 interest_index.INTERESTS_OPTIONS
+
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    location_visible = db.Column(db.Boolean, default=True)
+    geohash = db.Column(db.String(12))  # 随经纬度更新，离线推荐按前缀划分邻域
+
+    phone = db.Column(db.String(20))
+    wechat = db.Column(db.String(50))
+    contact_visible = db.Column(db.Boolean, default=False)
+
+    profile_visible = db.Column(db.Boolean, default=True)
+    virtual_partner_preference = db.Column(db.Text)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+
+    def update_geohash(self):
+        """根据当前经纬度重新计算geohash"""
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = None
+
+    def to_dict(self, include_private=False):
+        data = {
+            'id': self.id,
+            'user_id': self.user_id,
+            'full_name': self.full_name or '未设置',
+            'age': self.age or '未设置',
+            'gender': self.gender or '未设置',
+            'bio': self.bio or '暂无简介',
+        }
+
+        if include_private or self.profile_visible:
+            if include_private or self.location_visible:
+                data.update({
+                    'latitude': self.latitude,
+                    'longitude': self.longitude
+                })
+
+            if include_private or self.contact_visible:
+                data.update({
+                    'phone': self.phone,
+                    'wechat': self.wechat
+                })
+
+        return data
+
+
+class Match(db.Model):
+    __tablename__ = 'matches'
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # 修复这里
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    matched_user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+
+    status = db.Column(db.String(20), default='pending', index=True)
+    contact_exchanged = db.Column(db.Boolean, default=False)
+    contact_exchange_requested = db.Column(db.Boolean, default=False)
+
+    is_virtual_partner = db.Column(db.Boolean, default=False)
+    virtual_partner_start = db.Column(db.DateTime)
+    virtual_partner_end = db.Column(db.DateTime)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_matches_user_status', 'user_id', 'status'),
+        db.Index('ix_matches_matched_user_status', 'matched_user_id', 'status'),
+        # 同一发送者对同一接收者只有一条记录，被拒绝后重新发送时复用
+        db.Index('ux_matches_pair', 'user_id', 'matched_user_id', unique=True),
+    )
+
+
+class Recommendation(db.Model):
+    """离线任务预先计算好的匹配推荐"""
+    __tablename__ = 'recommendations'
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    recommended_user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+
+    rank = db.Column(db.Integer, nullable=False)
+    match_score = db.Column(db.Integer, nullable=False)
+    distance = db.Column(db.Float)
+
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_recommendations_user_rank', 'user_id', 'rank'),
+        db.Index('ix_recommendations_recommended_user', 'recommended_user_id'),
+    )
+
+
+class RecommendationRun(db.Model):
+    """离线推荐任务的运行记录，增量运行时以上次开始时间为界"""
+    __tablename__ = 'recommendation_runs'
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    started_at = db.Column(db.DateTime, nullable=False, index=True)
+    finished_at = db.Column(db.DateTime)
+    users_processed = db.Column(db.Integer, default=0)
+
+
+class Message(db.Model):
+    """两个用户之间的私信"""
+    __tablename__ = 'messages'
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    conversation_id = db.Column(db.String(73), nullable=False)  # 双方 user_id 排序后用冒号连接
+    sender_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    recipient_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_messages_conversation_created', 'conversation_id', 'created_at', 'id'),
+        db.Index('ix_messages_recipient_created', 'recipient_id', 'created_at', 'id'),
+        db.Index('ix_messages_sender_created', 'sender_id', 'created_at', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'conversation_id': self.conversation_id,
+            'sender_id': self.sender_id,
+            'recipient_id': self.recipient_id,
+            'body': self.body,
+            'created_at': self.created_at.isoformat(),
+        }
+
+
+# 工具函数
+def validate_email(email):
+    import re
+    if not email:
+        return False
+    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return re.match(pattern, email) is not None
+
+
+def validate_password(password):
+    import re
+    if not password or len(password) < 8:
+        return False
+    if not re.search(r'[A-Za-z]', password):
+        return False
+    if not re.search(r'\d', password):
+        return False
+    return True
+
+
+def duplicate_user_message(error):
+    """将用户表唯一约束冲突转换为提示信息"""
+    message = str(error.orig)
+    if 'users.username' in message:
+        return '用户名已存在'
+    if 'users.email' in message:
+        return '邮箱已被注册'
+    return '注册失败，请稍后重试'
+
+
+def match_relevant_fields(profile):
+    """返回会影响匹配推荐结果的资料字段"""
+    return (profile.age, profile.latitude, profile.longitude,
+            profile.profile_visible, profile.location_visible, profile.contact_visible)
+
+
+def not_matched_with(user_id):
+    """排除与 user_id 已有未被拒绝的匹配关系（任一方向）的用户，使用 NOT EXISTS 反连接"""
+    sent = db.session.query(Match.id).filter(
+        Match.user_id == user_id,
+        Match.status != 'rejected',
+        Match.matched_user_id == UserProfile.user_id
+    ).exists()
+    received = db.session.query(Match.id).filter(
+        Match.matched_user_id == user_id,
+        Match.status != 'rejected',
+        Match.user_id == UserProfile.user_id
+    ).exists()
+    return and_(~sent, ~received)
+
+
+def load_recommendations(user):
+    """读取离线任务为用户计算好的推荐，没有时返回 None"""
+    rows = db.session.query(Recommendation, UserProfile).join(
+        UserProfile, UserProfile.user_id == Recommendation.recommended_user_id
+    ).filter(
+        Recommendation.user_id == user.id,
+        UserProfile.profile_visible == True,
+        not_matched_with(user.id)
+    ).order_by(Recommendation.rank).all()
+
+    if not rows:
+        return None
+
+    matches = []
+    for recommendation, profile in rows:
+        match_data = profile.to_dict()
+        match_data['match_score'] = recommendation.match_score
+        if recommendation.distance is not None:
+            match_data['distance'] = recommendation.distance
+        matches.append(match_data)
+
+    return matches
+
+
+def find_potential_matches(user, virtual_partner=False, max_results=20, radius_km=None, after=None):
+    """简化版匹配算法，指定 radius_km 时只在该范围内查找，after 为分页游标 (score, user_id)"""
+    try:
+        # 在内存资料库中打分，只为最终结果加载完整资料
+        ranked = profile_store.top_matches(user.profile, max_results, radius_km=radius_km, after=after,
+                                           exclude=lambda user_ids: matched_among(user.id, user_ids))
+        profiles = load_profiles([user_id for _, _, user_id in ranked])
+
+        matches = []
+        for score, distance, user_id in ranked:
+            profile = profiles.get(user_id)
+            if profile is None:
+                continue
+            match_data = profile.to_dict()
+            match_data['match_score'] = score
+
+            if distance != float('inf'):
+                match_data['distance'] = round(distance, 2)
+
+            matches.append(match_data)
+
+        return matches
+    except Exception as e:
+        print(f"匹配算法错误: {e}")
+        return []
+
+
+def cached_matches(user):
+    """
+    依次读取缓存、离线推荐和实时计算得到的推荐列表，按 (匹配度从高到低, user_id 升序) 排序
+    默认半径下的每一页都从这份列表中取，翻页时不会混用两种排名
+    """
+    matches = match_cache.get(user.id)
+    if matches is None:
+        # 优先读取离线推荐，还没有计算过的用户实时计算
+        matches = load_recommendations(user)
+        if matches is None:
+            matches = find_potential_matches(user, max_results=app.config['MATCH_LIST_SIZE'],
+                                             radius_km=MATCH_RADIUS_KM)
+        match_cache.set(user.id, matches)
+    return matches
+
+
+def find_match_page(user, limit, radius_km=MATCH_RADIUS_KM, after=None):
+    """
+    按 (匹配度从高到低, user_id 升序) 返回一页匹配推荐和下一页游标，没有下一页时游标为 None
+    默认半径下所有页都取自 cached_matches 的同一份列表，其他半径每页都在内存资料库中实时排名
+    """
+    if radius_km == MATCH_RADIUS_KM:
+        matches = cached_matches(user)
+        if after is not None:
+            after_key = (-after[0], after[1])
+            matches = [match for match in matches if (-match['match_score'], match['user_id']) > after_key]
+    else:
+        # 多取一条用来判断是否还有下一页
+        matches = find_potential_matches(user, max_results=limit + 1, radius_km=radius_km, after=after)
+
+    page = matches[:limit]
+    next_cursor = None
+    if len(matches) > limit:
+        next_cursor = encode_cursor(page[-1]['match_score'], page[-1]['user_id'])
+    return page, next_cursor
+
+
+def find_nearby_page(user_profile, radius_km, limit, after=None):
+    """
+    按 (距离, user_id) 返回 radius_km 范围内的一页附近用户和下一页游标
+    在内存资料库中筛选和排序，只为当前页加载完整资料
+    """
+    # 多取一条用来判断是否还有下一页
+    page = profile_store.nearby(user_profile.user_id, user_profile.latitude, user_profile.longitude,
+                                radius_km, limit + 1, after=after)
+    next_cursor = encode_cursor(*page[limit - 1]) if len(page) > limit else None
+    page = page[:limit]
+    profiles = load_profiles([user_id for _, user_id in page])
+
+    nearby_users = []
+    for distance, user_id in page:
+        profile = profiles.get(user_id)
+        if profile is not None:
+            user_data = profile.to_dict()
+            user_data['distance'] = round(distance, 2)
+            nearby_users.append(user_data)
+    return nearby_users, next_cursor
+
+
+def parse_page_args(default_radius_km):
+    """解析 API 的 limit、radius 和 cursor 参数，格式错误时抛出 ValueError"""
+    limit = parse_positive_number(request.args.get('limit'), app.config['API_PAGE_SIZE'],
+                                  app.config['API_MAX_PAGE_SIZE'])
+    radius_km = parse_positive_number(request.args.get('radius'), default_radius_km,
+                                      app.config['API_MAX_RADIUS_KM'], cast=float)
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+    return limit, radius_km, after
+
+
+def conversation_id_for(user_id, other_user_id):
+    """同一对用户无论谁发送，会话ID都相同"""
+    return ':'.join(sorted((user_id, other_user_id)))
+
+
+def message_cursor(message):
+    return encode_cursor(datetime_to_sort_value(message.created_at), message.id)
+
+
+def decode_message_cursor(cursor):
+    """解析消息游标，返回 (created_at, message_id)，格式不对时抛出 ValueError"""
+    sort_value, message_id = decode_cursor(cursor)
+    return sort_value_to_datetime(sort_value), message_id
+
+
+def messaging_blocked(user_id, other_user_id):
+    """任意一方屏蔽了对方时不能互发消息"""
+    return db.session.query(Match.id).filter(
+        or_(and_(Match.user_id == user_id, Match.matched_user_id == other_user_id),
+            and_(Match.user_id == other_user_id, Match.matched_user_id == user_id)),
+        Match.status == 'blocked'
+    ).first() is not None
+
+
+def find_message_page(conversation_id, limit, after=None):
+    """
+    按 (created_at, id) 从新到旧返回会话的一页消息和下一页（更早的消息）游标
+    条件和排序都在 (conversation_id, created_at, id) 索引上，翻页不需要 OFFSET
+    """
+    query = Message.query.filter(Message.conversation_id == conversation_id)
+    if after is not None:
+        query = query.filter(tuple_(Message.created_at, Message.id) < tuple_(*after))
+    # 多取一条用来判断是否还有下一页
+    messages = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+    page = messages[:limit]
+    next_cursor = message_cursor(page[-1]) if len(messages) > limit else None
+    return [message.to_dict() for message in page], next_cursor
+
+
+def messages_since(user_id, after, limit):
+    """用户收到和发出的、在游标之后的消息，从旧到新，用于事件流重连时补发"""
+    newer = tuple_(Message.created_at, Message.id) > tuple_(*after)
+    # 收到和发出的分别走各自的索引，再合并排序
+    received = Message.query.filter(Message.recipient_id == user_id, newer)
+    sent = Message.query.filter(Message.sender_id == user_id, newer)
+    return received.union_all(sent).order_by(Message.created_at, Message.id).limit(limit).all()
+
+
+def publish_message(message):
+    """把新消息推送给接收者和发送者自己打开的其他页面"""
+    event = ('message', message.to_dict(), message_cursor(message))
+    message_broker.publish(message.recipient_id, event)
+    message_broker.publish(message.sender_id, event)
+
+
+def format_sse(event, data, event_id=None):
+    """按 Server-Sent Events 格式输出一个事件，data 为 JSON（不含换行）"""
+    lines = [f'id: {event_id}'] if event_id else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_events(subscription, backlog):
+    """
+    先发出补发的消息，再等待订阅中的新事件，空闲时定期发送心跳注释
+    到达 EVENT_STREAM_TIMEOUT 或积压溢出时结束，浏览器带 Last-Event-ID 自动重连
+    """
+    heartbeat = app.config['EVENT_STREAM_HEARTBEAT']
+    deadline = time.monotonic() + app.config['EVENT_STREAM_TIMEOUT']
+
+    yield 'retry: 3000\n\n'
+    # 订阅先于补发查询，两者之间到达的消息可能重复，按消息ID去重
+    sent_ids = set()
+    for data, event_id in backlog:
+        sent_ids.add(data['id'])
+        yield format_sse('message', data, event_id)
+
+    while not subscription.overflowed:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        event = subscription.get(timeout=min(heartbeat, remaining))
+        if event is None:
+            yield ': keep-alive\n\n'
+            continue
+        name, data, event_id = event
+        if name == 'message' and data['id'] in sent_ids:
+            continue
+        yield format_sse(name, data, event_id)
+
+
+def load_profile_rows(since=None):
+    """为内存资料库读取资料，since 不为 None 时只读取之后有更新的资料"""
+    query = db.session.query(
+        UserProfile.user_id, UserProfile.age, UserProfile.latitude, UserProfile.longitude,
+        UserProfile.profile_visible, UserProfile.location_visible
+    )
+    if since is not None:
+        query = query.filter(UserProfile.updated_at >= since)
+    return query.yield_per(10000)
+
+
+# 按列存放的内存资料库，匹配打分和附近的人在其中筛选，首次使用时加载
+profile_store = ProfileStore(load_profile_rows, refresh_interval=app.config['PROFILE_STORE_REFRESH_INTERVAL'])
+
+
+def matched_among(user_id, candidate_ids):
+    """返回 candidate_ids 中与 user_id 已有未被拒绝的匹配关系（任一方向）的用户，只查询这些候选人"""
+    matched = set()
+    for start in range(0, len(candidate_ids), 500):
+        batch = candidate_ids[start:start + 500]
+        sent = db.session.query(Match.matched_user_id.label('user_id')).filter(
+            Match.user_id == user_id, Match.matched_user_id.in_(batch), Match.status != 'rejected')
+        received = db.session.query(Match.user_id.label('user_id')).filter(
+            Match.matched_user_id == user_id, Match.user_id.in_(batch), Match.status != 'rejected')
+        matched.update(matched_id for (matched_id,) in sent.union(received))
+    return matched
+
+
+def count_pending_requests(user_id):
+    """统计用户收到的待处理匹配请求数，走 (matched_user_id, status) 索引"""
+    return db.session.query(db.func.count(Match.id)).filter(
+        Match.matched_user_id == user_id, Match.status == 'pending').scalar()
+
+
+# 待处理匹配请求数，首次展示时统计一次，之后随请求的发送和处理增量更新
+pending_counts = PendingRequestCounts(count_pending_requests, max_size=app.config['PENDING_COUNT_CACHE_SIZE'],
+                                      ttl=app.config['PENDING_COUNT_CACHE_TTL'])
+
+
+def load_profiles(user_ids):
+    """按 user_id 批量加载完整资料，返回 {user_id: UserProfile}"""
+    if not user_ids:
+        return {}
+    return {profile.user_id: profile for profile in
+            UserProfile.query.filter(UserProfile.user_id.in_(user_ids))}
+
+
+def write_last_logins(last_logins):
+    """按主键批量更新用户的最近登录时间"""
+    with app.app_context():
+        db.session.execute(update(User), [
+            {'id': user_id, 'last_login': timestamp} for user_id, timestamp in last_logins.items()
+        ])
+        db.session.commit()
+
+
+# 密码哈希
+password_hasher = ThrottledPasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    max_concurrent=app.config['PASSWORD_HASH_CONCURRENCY']
+)
+
+# 最近登录时间异步批量写入
+last_login_buffer = LastLoginBuffer(
+    write_last_logins,
+    interval=app.config['LAST_LOGIN_FLUSH_INTERVAL'],
+    batch_size=app.config['LAST_LOGIN_FLUSH_BATCH_SIZE']
+)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    # 同一条SQL里连同个人资料一起加载，避免路由中访问 current_user.profile 时再查一次
+    # Flask-Login 会把结果缓存在本次请求中，每个请求只调用一次
+    return db.session.get(User, user_id, options=[joinedload(User.profile)])
+
+
+# 创建数据库表
+def create_tables():
+    with app.app_context():
+        try:
+            db.create_all()
+            upgrade_schema()
+            backfill_geohash()
+            print("✅ 数据库表创建成功！")
+
+            # 创建测试用户
+            if User.query.count() == 0:
+                create_test_users()
+
+        except Exception as e:
+            print(f"❌ 数据库创建失败: {e}")
+
+
+def upgrade_schema(engine=None):
+    """为已有数据库补齐新增的表、列和索引，返回执行的变更列表（见 schema.upgrade_schema）"""
+    return schema.upgrade_schema(engine or db.engine, db.metadata)
+
+
+def backfill_geohash():
+    """为旧数据回填geohash"""
+    missing = UserProfile.query.filter(
+        UserProfile.geohash.is_(None),
+        UserProfile.latitude.isnot(None),
+        UserProfile.longitude.isnot(None)
+    ).all()
+    for profile in missing:
+        profile.update_geohash()
+    if missing:
+        db.session.commit()
+
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """升级已有数据库结构（flask --app app upgrade-db）"""
+    try:
+        changes = upgrade_schema()
+        backfill_geohash()
+        for change in changes:
+            print(f"  {change}")
+        print(f"✅ 数据库升级完成，共 {len(changes)} 项变更")
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ 数据库升级失败: {e}")
+
+
+def build_recommendations(full=False, workers=None):
+    """
+    离线计算匹配推荐并写入 recommendations 表，返回更新的用户数
+    按 geohash 邻域分组后交给进程池打分；增量运行时只重算上次运行后资料有变化的用户所在及相邻的邻域，
+    以及现有推荐里有变化用户的人（例如变化用户搬走前的邻居）
+    """
+    started_at = datetime.utcnow()
+    last_run = None
+    if not full:
+        last_run = RecommendationRun.query.order_by(RecommendationRun.started_at.desc()).first()
+
+    rows = [ProfileRow(*values) for values in db.session.query(
+        UserProfile.user_id, UserProfile.age, UserProfile.latitude, UserProfile.longitude,
+        UserProfile.geohash, UserProfile.profile_visible
+    )]
+
+    changed_user_ids = None
+    if last_run is not None:
+        changed_user_ids = {user_id for (user_id,) in db.session.query(UserProfile.user_id).filter(
+            UserProfile.updated_at > last_run.started_at
+        )}
+
+    top_n = app.config['RECOMMENDATIONS_PER_USER']
+    stale_viewer_ids, score_floors = set(), {}
+    if changed_user_ids:
+        changed = list(changed_user_ids)
+        for start in range(0, len(changed), 500):
+            stale_viewer_ids.update(user_id for (user_id,) in db.session.query(Recommendation.user_id).filter(
+                Recommendation.recommended_user_id.in_(changed[start:start + 500])
+            ).distinct())
+
+        # 没有位置的用户推荐已满时，变化的用户分数不低于其最低分才可能进入推荐
+        no_location_ids = [row.user_id for row in rows if neighborhood_key(row) is None]
+        for start in range(0, len(no_location_ids), 500):
+            score_floors.update(db.session.query(Recommendation.user_id, func.min(Recommendation.match_score)).filter(
+                Recommendation.user_id.in_(no_location_ids[start:start + 500])
+            ).group_by(Recommendation.user_id).having(func.count() >= top_n))
+
+    groups = build_neighborhoods(rows, MATCH_RADIUS_KM, changed_user_ids, stale_viewer_ids, score_floors)
+    tasks = [(viewers, candidates, top_n, MATCH_RADIUS_KM) for viewers, candidates in groups]
+
+    users_processed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for (viewers, _), recommendation_rows in zip(groups, executor.map(score_neighborhood, tasks)):
+            viewer_ids = [viewer.user_id for viewer in viewers]
+            for start in range(0, len(viewer_ids), 500):
+                Recommendation.query.filter(
+                    Recommendation.user_id.in_(viewer_ids[start:start + 500])
+                ).delete(synchronize_session=False)
+
+            if recommendation_rows:
+                for row in recommendation_rows:
+                    row['computed_at'] = started_at
+                db.session.execute(db.insert(Recommendation), recommendation_rows)
+
+            db.session.commit()
+            users_processed += len(viewer_ids)
+
+    db.session.add(RecommendationRun(
+        started_at=started_at,
+        finished_at=datetime.utcnow(),
+        users_processed=users_processed
+    ))
+    db.session.commit()
+    return users_processed
+
+
+@app.cli.command('build-recommendations')
+@click.option('--full', is_flag=True, help='忽略上次运行记录，重新计算所有用户')
+@click.option('--workers', type=int, default=None, help='进程池大小，默认为CPU核数')
+def build_recommendations_command(full, workers):
+    """离线计算匹配推荐（flask --app app build-recommendations）"""
+    try:
+        count = build_recommendations(full=full, workers=workers)
+        print(f"✅ 已更新 {count} 个用户的推荐")
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ 推荐计算失败: {e}")
+
+
+def write_import_batch(user_rows, profile_rows, seen_usernames, seen_emails):
+    """
+    写入一批导入的用户和资料，跳过文件内重复及数据库中已存在的用户名/邮箱
+    返回 (写入数, 重复数)
+    """
+    existing_usernames, existing_emails = set(), set()
+    for start in range(0, len(user_rows), 500):
+        chunk = user_rows[start:start + 500]
+        for username, email in db.session.query(User.username, User.email).filter(or_(
+            User.username.in_([row['username'] for row in chunk]),
+            User.email.in_([row['email'] for row in chunk])
+        )):
+            existing_usernames.add(username)
+            existing_emails.add(email)
+
+    users, profiles = [], []
+    for user_row, profile_row in zip(user_rows, profile_rows):
+        username, email = user_row['username'], user_row['email']
+        if (username in existing_usernames or username in seen_usernames or
+                email in existing_emails or email in seen_emails):
+            continue
+        seen_usernames.add(username)
+        seen_emails.add(email)
+        users.append(user_row)
+        profiles.append(profile_row)
+
+    if users:
+        # updated_at 取写入时间而不是哈希开始前的时间，否则会落在内存资料库增量同步的起点之前
+        now = datetime.utcnow()
+        for profile_row in profiles:
+            profile_row['updated_at'] = now
+        db.session.execute(User.__table__.insert(), users)
+        db.session.execute(UserProfile.__table__.insert(), profiles)
+    db.session.commit()
+    return len(users), len(user_rows) - len(users)
+
+
+def import_users(path, batch_size=5000, workers=None, hash_method=None):
+    """
+    从 CSV / JSONL 文件批量导入用户和个人资料
+    文件流式读取，密码哈希在进程池中计算，每批用 executemany 写入并在一个事务中提交
+    无法解析的行和格式不正确的记录计入无效数，不中断导入
+    返回 (导入数, 无效数, 重复数, 耗时秒)
+    """
+    hash_method = hash_method or app.config['PASSWORD_HASH_METHOD']
+    workers = workers or os.cpu_count() or 1
+    upgrade_schema()  # 新数据库上先建表，已有数据库补齐缺少的列和索引
+    started = time.perf_counter()
+    imported = invalid = duplicates = 0
+    seen_usernames, seen_emails = set(), set()
+
+    def write(future):
+        nonlocal imported, invalid, duplicates
+        user_rows, profile_rows, errors = future.result()
+        written, skipped = write_import_batch(user_rows, profile_rows, seen_usernames, seen_emails)
+        imported += written
+        duplicates += skipped
+        invalid += len(errors)
+        for username, reason in errors[:5]:
+            print(f"  跳过 {username or '(空)'}: {reason}")
+
+        elapsed = time.perf_counter() - started
+        print(f"  已导入 {imported} 行，{imported / elapsed:.0f} 行/秒")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # 同时最多处理 workers * 2 批，避免把整个文件读进内存
+        pending = deque()
+        for batch in read_batches(read_records(path), batch_size):
+            pending.append(executor.submit(prepare_batch, (batch, hash_method)))
+            if len(pending) >= workers * 2:
+                write(pending.popleft())
+        while pending:
+            write(pending.popleft())
+
+    return imported, invalid, duplicates, time.perf_counter() - started
+
+
+@app.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', type=int, default=5000, show_default=True, help='每个事务写入的行数')
+@click.option('--workers', type=int, default=None, help='计算密码哈希的进程数，默认为CPU核数')
+@click.option('--hash-method', default=None, help='密码哈希方法，默认使用 PASSWORD_HASH_METHOD')
+def import_users_command(path, batch_size, workers, hash_method):
+    """从 CSV / JSONL 批量导入用户（flask --app app import-users users.jsonl）"""
+    try:
+        imported, invalid, duplicates, elapsed = import_users(path, batch_size, workers, hash_method)
+        print(f"✅ 导入 {imported} 个用户，无效 {invalid} 行，重复 {duplicates} 行，"
+              f"耗时 {elapsed:.1f} 秒（{imported / max(elapsed, 1e-9):.0f} 行/秒）")
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ 导入失败: {e}")
+
+
+def create_test_users():
+    """创建测试用户"""
+    try:
+        # 测试用户1
+        user1 = User(
+            username="demo",
+            email="demo@example.com",
+            password_hash=password_hasher.hash("password123")
+        )
+        db.session.add(user1)
+        db.session.commit()  # 先提交获取ID
+
+        profile1 = UserProfile(
+            user_id=user1.id,
+            full_name="演示用户",
+            age=25,
+            gender="男",
+            bio="这是一个演示用户账号",
+            latitude=39.9042,
+            longitude=116.4074
+        )
+        profile1.update_geohash()
+        db.session.add(profile1)
+
+        # 测试用户2
+        user2 = User(
+            username="test",
+            email="test@example.com",
+            password_hash=password_hasher.hash("password123")
+        )
+        db.session.add(user2)
+        db.session.commit()  # 先提交获取ID
+
+        profile2 = UserProfile(
+            user_id=user2.id,
+            full_name="测试用户",
+            age=23,
+            gender="女",
+            bio="喜欢旅行和阅读",
+            latitude=39.9163,
+            longitude=116.3972
+        )
+        profile2.update_geohash()
+        db.session.add(profile2)
+
+        db.session.commit()
+        print("✅ 测试用户创建成功！")
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ 创建测试用户失败: {e}")
+
+
+# 路由定义
+@app.route('/')
+def index():
+    return redirect(url_for('home'))
+
+
+@app.route('/home')
+def home():
+    return render_template('home.html')
+
+# 添加缺失的路由
+@app.route('/messages')
+@login_required
+def messages():
+    """消息页面"""
+    return render_template('messages.html')
+
+@app.route('/settings')
+@login_required
+def settings():
+    """设置页面"""
+    return render_template('settings.html')
+
+
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('dashboard'))
+
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+
+        if not username or not password:
+            flash('请输入用户名和密码', 'error')
+            return render_template('login.html')
+
+        user = User.query.filter_by(username=username).first()
+
+        if user and password_hasher.verify(user.password_hash, password):
+            if password_hasher.needs_rehash(user.password_hash):
+                # 哈希参数已调整或为旧格式，按当前配置重新哈希
+                user.password_hash = password_hasher.hash(password)
+                db.session.commit()
+
+            login_user(user)
+            last_login_buffer.record(user.id, datetime.utcnow())
+            flash('登录成功！', 'success')
+            return redirect(url_for('dashboard'))
+        else:
+            flash('用户名或密码错误', 'error')
+
+    return render_template('login.html')
+
+
+@app.route('/register', methods=['GET', 'POST'])
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for('dashboard'))
+
+    if request.method == 'POST':
+        username = request.form.get('username')
+        email = request.form.get('email')
+        password = request.form.get('password')
+        confirm_password = request.form.get('confirm_password')
+
+        if not all([username, email, password, confirm_password]):
+            flash('请填写所有必填字段', 'error')
+            return render_template('register.html')
+
+        if password != confirm_password:
+            flash('两次输入的密码不一致', 'error')
+            return render_template('register.html')
+
+        if not validate_email(email):
+            flash('邮箱格式不正确', 'error')
+            return render_template('register.html')
+
+        if not validate_password(password):
+            flash('密码必须包含字母和数字，且长度至少8位', 'error')
+            return render_template('register.html')
+
+        # 一次查询同时检查用户名和邮箱
+        existing = db.session.query(User.username, User.email).filter(
+            or_(User.username == username, User.email == email)
+        ).all()
+        if any(row.username == username for row in existing):
+            flash('用户名已存在', 'error')
+            return render_template('register.html')
+        if existing:
+            flash('邮箱已被注册', 'error')
+            return render_template('register.html')
+
+        try:
+            # 在客户端生成ID，用户和个人资料在同一个事务中写入
+            new_user = User(
+                id=str(uuid.uuid4()),
+                username=username,
+                email=email,
+                password_hash=password_hasher.hash(password)
+            )
+            profile = UserProfile(user_id=new_user.id)
+            db.session.add_all([new_user, profile])
+            db.session.commit()
+            profile_store.upsert_profile(profile)
+
+            flash('注册成功，请登录', 'success')
+            return redirect(url_for('login'))
+        except IntegrityError as e:
+            # 检查之后被并发注册抢先占用
+            db.session.rollback()
+            flash(duplicate_user_message(e), 'error')
+        except Exception as e:
+            db.session.rollback()
+            flash('注册失败，请稍后重试', 'error')
+            print(f"注册错误: {e}")
+
+    return render_template('register.html')
+
+
+@app.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    flash('您已成功退出登录', 'success')
+    return redirect(url_for('home'))
+
+
+@app.route('/dashboard')
+@login_required
+def dashboard():
+    # 确保用户有个人资料
+    if not hasattr(current_user, 'profile'):
+        profile = UserProfile(user_id=current_user.id)
+        db.session.add(profile)
+        db.session.commit()
+
+    pending_requests = pending_counts.get(current_user.id)
+    return render_template('dashboard.html', user=current_user, pending_requests=pending_requests)
+
+
+@app.route('/nearby')
+@login_required
+def nearby_people():
+    user_profile = current_user.profile
+
+    if not user_profile.latitude or not user_profile.longitude:
+        flash('请先设置您的位置信息', 'warning')
+        return redirect(url_for('edit_profile'))
+
+    try:
+        nearby_users, next_cursor = find_nearby_page(user_profile, NEARBY_RADIUS_KM, app.config['API_PAGE_SIZE'])
+        return render_template('nearby.html', nearby_users=nearby_users, next_cursor=next_cursor,
+                               radius_km=NEARBY_RADIUS_KM)
+    except Exception as e:
+        flash('获取附近用户失败', 'error')
+        print(f"附近用户错误: {e}")
+        return render_template('nearby.html', nearby_users=[], next_cursor=None, radius_km=NEARBY_RADIUS_KM)
+
+
+@app.route('/api/nearby')
+@login_required
+def api_nearby():
+    """附近的人 JSON 接口，按距离分页：?limit=20&radius=50&cursor=..."""
+    user_profile = current_user.profile
+    if not user_profile.latitude or not user_profile.longitude:
+        return jsonify({'success': False, 'message': '请先设置您的位置信息'}), 400
+
+    try:
+        limit, radius_km, after = parse_page_args(NEARBY_RADIUS_KM)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    try:
+        items, next_cursor = find_nearby_page(user_profile, radius_km, limit, after=after)
+        return jsonify({'success': True, 'items': items, 'next_cursor': next_cursor})
+    except Exception as e:
+        print(f"附近用户错误: {e}")
+        return jsonify({'success': False, 'message': '获取附近用户失败'}), 500
+
+
+@app.route('/matching')
+@login_required
+def matching():
+    try:
+        potential_matches, next_cursor = find_match_page(current_user, app.config['API_PAGE_SIZE'])
+        return render_template('matching.html', potential_matches=potential_matches, next_cursor=next_cursor)
+    except Exception as e:
+        flash('匹配功能暂时不可用', 'error')
+        print(f"匹配错误: {e}")
+        return render_template('matching.html', potential_matches=[], next_cursor=None)
+
+
+@app.route('/api/matches')
+@login_required
+def api_matches():
+    """匹配推荐 JSON 接口，按匹配度分页：?limit=20&radius=100&cursor=..."""
+    try:
+        limit, radius_km, after = parse_page_args(MATCH_RADIUS_KM)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    try:
+        items, next_cursor = find_match_page(current_user, limit, radius_km=radius_km, after=after)
+        return jsonify({'success': True, 'items': items, 'next_cursor': next_cursor})
+    except Exception as e:
+        print(f"匹配错误: {e}")
+        return jsonify({'success': False, 'message': '匹配功能暂时不可用'}), 500
+
+
+@app.route('/send_match_request/<user_id>', methods=['POST'])
+@login_required
+def send_match_request(user_id):
+    """向 user_id 发送匹配请求，对方打开页面时通过事件流实时收到 match_request 事件"""
+    if user_id == current_user.id:
+        return jsonify({'success': False, 'message': '不能向自己发送匹配请求'}), 400
+    if db.session.get(User, user_id) is None:
+        return jsonify({'success': False, 'message': '用户不存在'}), 404
+
+    # 双方之间已有未被拒绝的匹配关系时不再重复发送
+    between = or_(and_(Match.user_id == current_user.id, Match.matched_user_id == user_id),
+                  and_(Match.user_id == user_id, Match.matched_user_id == current_user.id))
+    existing = Match.query.filter(between, Match.status != 'rejected').first()
+    if existing is not None:
+        if existing.status == 'pending':
+            message = '已经发送过匹配请求' if existing.user_id == current_user.id else '对方已向你发送匹配请求'
+        elif existing.status == 'accepted':
+            message = '你们已经匹配成功'
+        else:
+            message = '无法向该用户发送匹配请求'
+        return jsonify({'success': False, 'message': message}), 409
+
+    try:
+        # 检查和写入之间可能有并发的请求：写入本身带上"双方之间没有未被拒绝的匹配关系"的条件，
+        # 同方向的重复插入再由 ux_matches_pair 唯一索引拦下，只有真正写入时才增加对方的计数
+        # correlate(None)：在 UPDATE matches 中使用时不与被更新的行关联
+        no_active = ~select(Match.id).where(between, Match.status != 'rejected').correlate(None).exists()
+        previous_id = db.session.query(Match.id).filter(
+            Match.user_id == current_user.id, Match.matched_user_id == user_id).scalar()
+        now = datetime.utcnow()
+        if previous_id is not None:
+            # 被拒绝过：复用原记录重新发送
+            match_id = previous_id
+            written = db.session.execute(
+                update(Match)
+                .where(Match.id == match_id, Match.status == 'rejected', no_active)
+                .values(status='pending', created_at=now, updated_at=now)
+            ).rowcount
+        else:
+            match_id = str(uuid.uuid4())
+            written = db.session.execute(
+                insert(Match).from_select(
+                    ['id', 'user_id', 'matched_user_id', 'status', 'created_at', 'updated_at'],
+                    select(literal(match_id), literal(current_user.id), literal(user_id), literal('pending'),
+                           literal(now), literal(now)).where(no_active))
+            ).rowcount
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        written = 0
+    except Exception as e:
+        db.session.rollback()
+        print(f"发送匹配请求错误: {e}")
+        return jsonify({'success': False, 'message': '发送失败'}), 500
+
+    if not written:
+        return jsonify({'success': False, 'message': '匹配请求已存在'}), 409
+
+    # 双方都不应再出现在对方缓存的推荐列表中
+    match_cache.drop(current_user.id)
+    match_cache.drop(user_id)
+
+    pending = pending_counts.add(user_id, 1)
+    profile = current_user.profile
+    message_broker.publish(user_id, ('match_request', {
+        'match_id': match_id,
+        'from_user_id': current_user.id,
+        'from_name': (profile.full_name if profile else None) or current_user.username,
+        'pending_requests': pending,
+    }, None))
+    return jsonify({'success': True, 'message': '匹配请求已发送'})
+
+
+@app.route('/match_requests/<match_id>/respond', methods=['POST'])
+@login_required
+def respond_match_request(match_id):
+    """接受或拒绝收到的匹配请求，请求体为 JSON {"action": "accept" | "reject"} 或表单字段 action"""
+    data = request.get_json(silent=True) or request.form
+    if not isinstance(data, dict):  # request.form 是 dict 的子类
+        return jsonify({'success': False, 'message': '请求格式不正确'}), 400
+    action = data.get('action')
+    status = {'accept': 'accepted', 'reject': 'rejected'}.get(action) if isinstance(action, str) else None
+    if status is None:
+        return jsonify({'success': False, 'message': '无效的操作'}), 400
+
+    try:
+        # 条件更新：只有仍在等待处理的请求会被修改，重复提交不会重复扣减计数
+        updated = db.session.execute(
+            update(Match)
+            .where(Match.id == match_id, Match.matched_user_id == current_user.id, Match.status == 'pending')
+            .values(status=status, updated_at=datetime.utcnow())
+        ).rowcount
+        sender_id = db.session.query(Match.user_id).filter(Match.id == match_id).scalar() if updated else None
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"处理匹配请求错误: {e}")
+        return jsonify({'success': False, 'message': '操作失败'}), 500
+
+    if not updated:
+        return jsonify({'success': False, 'message': '匹配请求不存在或已处理'}), 404
+
+    # 被拒绝后双方可以重新出现在推荐中
+    match_cache.drop(current_user.id)
+    match_cache.drop(sender_id)
+
+    pending = pending_counts.add(current_user.id, -1)
+    message_broker.publish(current_user.id, ('pending_requests', {'pending_requests': pending}, None))
+    message_broker.publish(sender_id, ('match_response', {
+        'match_id': match_id,
+        'user_id': current_user.id,
+        'status': status,
+    }, None))
+    return jsonify({'success': True, 'message': '已接受匹配请求' if status == 'accepted' else '已拒绝匹配请求',
+                    'pending_requests': pending})
+
+
+@app.route('/api/conversations/<user_id>/messages', methods=['GET'])
+@login_required
+def api_list_messages(user_id):
+    """与 user_id 的会话消息，从新到旧分页：?limit=20&cursor=..."""
+    try:
+        limit = parse_positive_number(request.args.get('limit'), app.config['API_PAGE_SIZE'],
+                                      app.config['API_MAX_PAGE_SIZE'])
+        cursor = request.args.get('cursor')
+        after = decode_message_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    try:
+        items, next_cursor = find_message_page(conversation_id_for(current_user.id, user_id), limit, after=after)
+        return jsonify({'success': True, 'items': items, 'next_cursor': next_cursor})
+    except Exception as e:
+        print(f"消息列表错误: {e}")
+        return jsonify({'success': False, 'message': '获取消息失败'}), 500
+
+
+@app.route('/api/conversations/<user_id>/messages', methods=['POST'])
+@login_required
+def api_send_message(user_id):
+    """给 user_id 发送一条消息，请求体为 JSON {"body": "..."} 或表单字段 body"""
+    data = request.get_json(silent=True) or request.form
+    if not isinstance(data, dict):  # request.form 是 dict 的子类
+        return jsonify({'success': False, 'message': '请求格式不正确'}), 400
+    body = data.get('body')
+    body = body.strip() if isinstance(body, str) else ''
+
+    if not body:
+        return jsonify({'success': False, 'message': '消息内容不能为空'}), 400
+    if len(body) > app.config['MESSAGE_MAX_LENGTH']:
+        return jsonify({'success': False, 'message': f"消息不能超过{app.config['MESSAGE_MAX_LENGTH']}字"}), 400
+    if user_id == current_user.id:
+        return jsonify({'success': False, 'message': '不能给自己发消息'}), 400
+    if db.session.get(User, user_id) is None:
+        return jsonify({'success': False, 'message': '用户不存在'}), 404
+    if messaging_blocked(current_user.id, user_id):
+        return jsonify({'success': False, 'message': '无法给该用户发送消息'}), 403
+
+    try:
+        message = Message(
+            id=str(uuid.uuid4()),
+            conversation_id=conversation_id_for(current_user.id, user_id),
+            sender_id=current_user.id,
+            recipient_id=user_id,
+            body=body,
+            created_at=datetime.utcnow()
+        )
+        db.session.add(message)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"发送消息错误: {e}")
+        return jsonify({'success': False, 'message': '发送失败'}), 500
+
+    publish_message(message)
+    return jsonify({'success': True, 'message': '消息已发送', 'item': message.to_dict(),
+                    'cursor': message_cursor(message)})
+
+
+@app.route('/api/events')
+@login_required
+def api_events():
+    """
+    当前用户的实时事件流（Server-Sent Events），新消息以 message 事件推送，事件ID为消息游标
+    匹配请求相关的通知为 match_request / match_response / pending_requests 事件，不带事件ID
+    断线重连时浏览器自动带上 Last-Event-ID（也可以用 ?cursor=），先补发这之后的消息
+    """
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    try:
+        after = decode_message_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    # 补发的消息在返回响应前查好，推送期间不占用数据库连接
+    subscription = message_broker.subscribe(current_user.id)
+    try:
+        backlog = []
+        if after is not None:
+            backlog = [(message.to_dict(), message_cursor(message)) for message in
+                       messages_since(current_user.id, after, app.config['EVENT_STREAM_BACKFILL_LIMIT'])]
+    except Exception:
+        subscription.close()
+        raise
+
+    response = Response(stream_events(subscription, backlog), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # 客户端断开或响应结束时取消订阅（即使生成器还没开始执行）
+    response.call_on_close(subscription.close)
+    return response
+
+
+@app.route('/virtual_partner')
+@login_required
+def virtual_partner():
+    return render_template('virtual_partner.html', current_partner=None, recommendations=[])
+
+
+@app.route('/profile')
+@login_required
+def profile():
+    # 确保有个人资料
+    if not hasattr(current_user, 'profile'):
+        profile = UserProfile(user_id=current_user.id)
+        db.session.add(profile)
+        db.session.commit()
+
+    return render_template('profile.html', profile=current_user.profile)
+
+
+@app.route('/edit_profile', methods=['GET', 'POST'])
+@login_required
+def edit_profile():
+    # 确保有个人资料
+    if not hasattr(current_user, 'profile'):
+        profile = UserProfile(user_id=current_user.id)
+        db.session.add(profile)
+        db.session.commit()
+
+    profile = current_user.profile
+
+    if request.method == 'POST':
+        # 影响匹配结果的字段，变化时需要让推荐缓存失效
+        match_fields_before = match_relevant_fields(profile)
+        try:
+            profile.full_name = request.form.get('full_name', '').strip() or None
+            profile.bio = request.form.get('bio', '').strip() or None
+            profile.gender = request.form.get('gender', '').strip() or None
+
+            age_str = request.form.get('age', '').strip()
+            profile.age = int(age_str) if age_str and age_str.isdigit() else None
+
+            lat_str = request.form.get('latitude', '').strip()
+            lon_str = request.form.get('longitude', '').strip()
+            profile.latitude = float(lat_str) if lat_str else None
+            profile.longitude = float(lon_str) if lon_str else None
+            profile.update_geohash()
+
+            profile.phone = request.form.get('phone', '').strip() or None
+            profile.wechat = request.form.get('wechat', '').strip() or None
+
+            profile.profile_visible = 'profile_visible' in request.form
+            profile.location_visible = 'location_visible' in request.form
+            profile.contact_visible = 'contact_visible' in request.form
+
+            match_fields_changed = match_relevant_fields(profile) != match_fields_before
+            if match_fields_changed:
+                # 离线推荐已过期，下次任务运行前改为实时计算
+                Recommendation.query.filter_by(user_id=current_user.id).delete()
+
+            db.session.commit()
+            profile_store.upsert_profile(profile)
+            if match_fields_changed:
+                match_cache.invalidate(current_user.id)
+            flash('个人资料已更新', 'success')
+            return redirect(url_for('profile'))
+        except Exception as e:
+            db.session.rollback()
+            flash('更新失败，请检查输入数据', 'error')
+            print(f"更新资料错误: {e}")
+
+    return render_template('edit_profile.html', profile=profile)
+
+
+@app.route('/admin/metrics')
+def metrics():
+    """Prometheus 格式的请求统计，仅管理员或携带 METRICS_TOKEN 的抓取请求可以访问"""
+    if request_instrumentation is None:
+        abort(404)
+
+    token = app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    token_ok = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    admin_ok = current_user.is_authenticated and current_user.username in app.config['ADMIN_USERNAMES']
+    if not (token_ok or admin_ok):
+        abort(403)
+
+    return Response(request_instrumentation.metrics.render_prometheus(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+# 错误处理
+@app.errorhandler(404)
+def not_found_error(error):
+    return render_template('404.html'), 404
+
+
+@app.errorhandler(500)
+def internal_error(error):
+    db.session.rollback()
+    return render_template('500.html'), 500
+
+
+if __name__ == '__main__':
+    create_tables()
+    with app.app_context():
+        profile_store.load()
+
+    print("=" * 50)
+    print("🎉 交友平台启动成功！")
+    print("📍 访问地址: http://127.0.0.1:5000")
+    print("👤 测试账号: demo / password123")
+    print("👤 测试账号: test / password123")
+    print("=" * 50)
+
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
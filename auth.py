@@ -1,19 +1,19 @@
-# utils/auth_utils.py
-import re
-
-def validate_email(email):
-    """验证邮箱格式"""
-    if not email:
-        return False
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-def validate_password(password):
-    """验证密码强度"""
-    if not password or len(password) < 8:
-        return False
-    if not re.search(r'[A-Za-z]', password):
-        return False
-    if not re.search(r'\d', password):
-        return False
+# utils/auth_utils.py
+import re
+
+def validate_email(email):
+    """验证邮箱格式"""
+    if not email:
+        return False
+    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return re.match(pattern, email) is not None
+
+def validate_password(password):
+    """验证密码强度"""
+    if not password or len(password) < 8:
+        return False
+    if not re.search(r'[A-Za-z]', password):
+        return False
+    if not re.search(r'\d', password):
+        return False
     return True
\ No newline at end of file
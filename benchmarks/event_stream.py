@@ -0,0 +1,137 @@
+# benchmarks/event_stream.py
+"""
+在一个进程内同时打开大量 /api/events 长连接，测量私信从发送到推送到接收者的延迟
+
+用法: python benchmarks/event_stream.py --connections 2000 --messages 500
+在临时 SQLite 数据库中生成 --connections 个用户，每个用户登录后打开一个事件流，
+再随机选取发送者和接收者调用 /api/conversations/<id>/messages，统计推送延迟和发送接口耗时
+默认使用 Werkzeug 多线程服务器（每个连接一个线程），生产环境可换成 gevent 等协程 worker
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.population import PASSWORD, generate_profiles
+
+
+def login(port, username):
+    """登录并返回会话 Cookie"""
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    body = f'username={username}&password={PASSWORD}'
+    conn.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    cookie = response.getheader('Set-Cookie')
+    if response.status != 302 or not cookie:
+        raise RuntimeError(f'{username} 登录失败: {response.status}')
+    return cookie.split(';', 1)[0]
+
+
+def open_stream(port, cookie, received):
+    """打开事件流，在后台线程中读取 message 事件，记录每条消息的到达时间"""
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('GET', '/api/events', headers={'Cookie': cookie, 'Accept': 'text/event-stream'})
+    response = conn.getresponse()
+    if response.status != 200:
+        raise RuntimeError(f'打开事件流失败: {response.status}')
+
+    def read():
+        try:
+            for line in response:
+                if line.startswith(b'data: '):
+                    data = json.loads(line[6:])
+                    received[data['body'], data['recipient_id']] = time.perf_counter()
+        except (OSError, ValueError):
+            pass
+
+    threading.Thread(target=read, daemon=True).start()
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大量长连接下的私信推送延迟')
+    parser.add_argument('--connections', type=int, default=2000, help='同时打开的事件流（用户）数')
+    parser.add_argument('--messages', type=int, default=500, help='发送的消息数')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    threading.stack_size(256 * 1024)  # 每个连接一个线程，缩小线程栈
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        # 登录不是这里要测的内容，用低成本哈希加快准备过程
+        os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        from werkzeug.serving import make_server
+
+        from app import (User, UserProfile, app, create_tables, db, last_login_buffer, message_broker,
+                         password_hasher)
+
+        create_tables()
+        with app.app_context():
+            for users, profiles in generate_profiles(args.connections, password_hasher.hash(PASSWORD)):
+                db.session.execute(User.__table__.insert(), users)
+                db.session.execute(UserProfile.__table__.insert(), profiles)
+                db.session.commit()
+            user_ids = dict(db.session.query(User.username, User.id).filter(User.username.like('bench%')))
+
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)  # 不打印每个请求的访问日志
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_port
+
+        started = time.perf_counter()
+        cookies = {username: login(port, username) for username in user_ids}
+        received = {}
+        streams = [open_stream(port, cookies[username], received) for username in user_ids]
+        while message_broker.subscriber_count() < len(streams):
+            time.sleep(0.05)
+        print(f"{len(streams)} 个事件流已打开（登录和建立连接耗时 {time.perf_counter() - started:.1f} 秒），"
+              f"进程线程数 {threading.active_count()}")
+
+        usernames = list(user_ids)
+        sent = {}
+        send_latencies = []
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        for i in range(args.messages):
+            sender, recipient = random.sample(usernames, 2)
+            body = json.dumps({'body': f'msg{i}'})
+            call_started = time.perf_counter()
+            conn.request('POST', f'/api/conversations/{user_ids[recipient]}/messages', body,
+                         {'Content-Type': 'application/json', 'Cookie': cookies[sender]})
+            response = conn.getresponse()
+            response.read()
+            send_latencies.append(time.perf_counter() - call_started)
+            sent[f'msg{i}', user_ids[recipient]] = call_started
+
+        deadline = time.perf_counter() + 10
+        while len(received.keys() & sent.keys()) < len(sent) and time.perf_counter() < deadline:
+            time.sleep(0.05)
+
+        delivered = [received[key] - sent[key] for key in sent if key in received]
+        print(f"已送达 {len(delivered)} / {len(sent)} 条消息")
+        for name, latencies in (('发送接口', send_latencies), ('推送到接收者', delivered)):
+            if latencies:
+                p50, p90, p99 = np.percentile(np.array(latencies) * 1000, [50, 90, 99])
+                print(f"{name:<10} p50 {p50:.2f}ms  p90 {p90:.2f}ms  p99 {p99:.2f}ms")
+
+        for stream in streams:
+            stream.close()
+        server.shutdown()
+        last_login_buffer.stop()
+
+
+if __name__ == '__main__':
+    main()
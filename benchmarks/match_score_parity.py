@@ -0,0 +1,122 @@
+# benchmarks/match_score_parity.py
+"""
+随机生成用户资料，检查批量匹配度 calculate_match_scores 与逐个计算的 calculate_match_score 结果完全一致，
+并比较两者的速度
+
+用法: python benchmarks/match_score_parity.py --rounds 200 --candidates 2000
+任意一组结果不一致时打印反例并以非零状态退出
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geolocation import calculate_distances
+from matching_algorithm import calculate_match_score, calculate_match_scores
+
+Profile = namedtuple('Profile', 'age latitude longitude')
+
+# 分档边界附近的年龄差和距离，随机数据很少正好落在边界上
+BOUNDARY_AGE_DIFFS = [0, 4, 5, 6, 9, 10, 11, 14, 15, 16, 40]
+BOUNDARY_DISTANCES = [0.0, 9.999, 10.0, 10.001, 49.999, 50.0, 50.001, 99.999, 100.0, 100.001, 500.0]
+
+
+def random_age(rng):
+    return rng.choice([None, 0, rng.randint(18, 70)])
+
+
+def random_coordinate(rng, center, spread):
+    return rng.choice([None, 0, 0.0, center + rng.uniform(-spread, spread)])
+
+
+def random_profile(rng):
+    return Profile(
+        random_age(rng) if rng.random() < 0.3 else rng.randint(18, 70),
+        random_coordinate(rng, 39.9, 1.5) if rng.random() < 0.3 else 39.9 + rng.uniform(-1.5, 1.5),
+        random_coordinate(rng, 116.4, 1.5) if rng.random() < 0.3 else 116.4 + rng.uniform(-1.5, 1.5),
+    )
+
+
+def check(viewer, candidates, distances=None):
+    """返回第一个不一致的 (候选人, 逐个结果, 批量结果)，全部一致时返回 None"""
+    batch = calculate_match_scores(
+        viewer, [c.age for c in candidates], [c.latitude for c in candidates],
+        [c.longitude for c in candidates], distances=distances
+    )
+    for i, candidate in enumerate(candidates):
+        distance = None if distances is None else float(distances[i])
+        expected = calculate_match_score(viewer, candidate, distance=distance)
+        if batch[i] != expected:
+            return candidate, expected, int(batch[i])
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量匹配度与逐个计算的一致性检查')
+    parser.add_argument('--rounds', type=int, default=200, help='随机生成多少个查看者')
+    parser.add_argument('--candidates', type=int, default=2000, help='每个查看者的候选人数')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = 0
+
+    for _ in range(args.rounds):
+        viewer = random_profile(rng)
+        candidates = [random_profile(rng) for _ in range(args.candidates)]
+
+        # 1. 由两边各自计算距离
+        mismatch = check(viewer, candidates)
+
+        # 2. 传入分档边界上的距离，年龄差取边界值
+        if mismatch is None:
+            edge_candidates = [
+                Profile((viewer.age or 30) + rng.choice([-1, 1]) * rng.choice(BOUNDARY_AGE_DIFFS),
+                        c.latitude, c.longitude)
+                for c in candidates
+            ]
+            distances = np.array([rng.choice(BOUNDARY_DISTANCES) for _ in edge_candidates])
+            distances[[c.latitude is None for c in edge_candidates]] = np.inf
+            mismatch = check(viewer, edge_candidates, distances)
+
+        if mismatch is not None:
+            failures += 1
+            candidate, expected, actual = mismatch
+            print(f"❌ viewer={viewer} candidate={candidate}: 逐个计算 {expected}，批量计算 {actual}")
+
+    total = args.rounds * args.candidates * 2
+    if failures:
+        print(f"❌ {failures} 组结果不一致")
+        sys.exit(1)
+    print(f"✅ {total} 对资料的匹配度全部一致")
+
+    # 速度对比：同一个查看者、同一批候选人
+    viewer = Profile(28, 39.9, 116.4)
+    candidates = [random_profile(rng) for _ in range(100000)]
+    # 与内存资料库一样使用列数组，None 转换为 nan
+    ages = np.array([c.age for c in candidates], dtype=np.float64)
+    latitudes = np.array([c.latitude for c in candidates], dtype=np.float64)
+    longitudes = np.array([c.longitude for c in candidates], dtype=np.float64)
+
+    started = time.perf_counter()
+    for candidate in candidates:
+        calculate_match_score(viewer, candidate)
+    scalar_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    distances = calculate_distances(viewer.latitude, viewer.longitude, latitudes, longitudes)
+    calculate_match_scores(viewer, ages, latitudes, longitudes, distances=distances)
+    batch_elapsed = time.perf_counter() - started
+
+    print(f"10万个候选人：逐个计算 {scalar_elapsed * 1000:.1f}ms，批量计算 {batch_elapsed * 1000:.1f}ms "
+          f"（{scalar_elapsed / batch_elapsed:.0f} 倍）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/password_hashing.py
+"""
+测量不同密码哈希成本参数下每秒可完成的登录校验次数
+
+用法: python benchmarks/password_hashing.py --concurrency 4 --seconds 2
+可用 --method 指定要测的方法（可重复），默认测一组常见的 pbkdf2 / scrypt 参数
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import ThrottledPasswordHasher
+
+DEFAULT_METHODS = [
+    'pbkdf2:sha256:100000',
+    'pbkdf2:sha256:300000',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:1000000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+]
+
+
+def measure(hasher, stored_hash, password, clients, seconds):
+    """clients 个并发请求持续校验密码 seconds 秒，返回 (每秒次数, 平均耗时毫秒)"""
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        count = 0
+        while time.perf_counter() < deadline:
+            hasher.verify(stored_hash, password)
+            count += 1
+        return count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        total = sum(pool.map(lambda _: client(), range(clients)))
+    elapsed = time.perf_counter() - started
+
+    return total / elapsed, elapsed / total * clients * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='密码哈希成本与登录吞吐量')
+    parser.add_argument('--method', action='append', help='Werkzeug 哈希方法，例如 scrypt:32768:8:1')
+    parser.add_argument('--concurrency', type=int, default=4, help='同时进行的哈希计算数上限（PASSWORD_HASH_CONCURRENCY）')
+    parser.add_argument('--clients', type=int, default=8, help='并发登录请求数')
+    parser.add_argument('--seconds', type=float, default=2.0, help='每种方法的测试时长')
+    args = parser.parse_args()
+
+    password = 'password123'
+    print(f"并发上限 {args.concurrency}，并发请求 {args.clients}")
+    print(f"{'方法':<24}{'单次校验(ms)':>14}{'登录/秒':>12}{'并发平均(ms)':>14}")
+
+    for method in args.method or DEFAULT_METHODS:
+        hasher = ThrottledPasswordHasher(method=method, max_concurrent=args.concurrency)
+        stored_hash = hasher.hash(password)
+
+        started = time.perf_counter()
+        hasher.verify(stored_hash, password)
+        single_ms = (time.perf_counter() - started) * 1000
+
+        per_second, latency_ms = measure(hasher, stored_hash, password, args.clients, args.seconds)
+        print(f"{hasher.method_prefix:<24}{single_ms:>14.1f}{per_second:>12.1f}{latency_ms:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
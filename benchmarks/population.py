@@ -0,0 +1,168 @@
+# benchmarks/population.py
+"""
+在合成用户数据上测量匹配、附近的人、匹配度计算和登录的延迟与吞吐量
+
+用法: python benchmarks/population.py --profiles 100000 --requests 200
+在临时 SQLite 数据库中按城市聚集生成用户（经纬度和年龄呈正态分布），
+再通过 Flask 测试客户端请求各个路由，输出 p50/p90/p99 延迟和每秒请求数
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+# (纬度, 经度, 权重)：用户按城市人口比例聚集
+CITIES = [
+    (39.9042, 116.4074, 0.22),  # 北京
+    (31.2304, 121.4737, 0.22),  # 上海
+    (23.1291, 113.2644, 0.14),  # 广州
+    (22.5431, 114.0579, 0.14),  # 深圳
+    (30.5728, 104.0668, 0.10),  # 成都
+    (30.2741, 120.1551, 0.10),  # 杭州
+    (34.3416, 108.9398, 0.08),  # 西安
+]
+
+PASSWORD = 'password123'
+
+
+def generate_profiles(count, password_hash, chunk_size=50000):
+    """分块生成用户和资料行"""
+    from geolocation import encode_geohash
+
+    weights = [city[2] for city in CITIES]
+    now = datetime.utcnow()
+
+    for start in range(0, count, chunk_size):
+        users, profiles = [], []
+        for i in range(start, min(start + chunk_size, count)):
+            user_id = str(uuid.uuid4())
+            users.append({'id': user_id, 'username': f'bench{i}', 'email': f'bench{i}@example.com',
+                          'password_hash': password_hash, 'created_at': now, 'last_login': now})
+
+            latitude = longitude = geohash = None
+            if random.random() < 0.95:
+                city_lat, city_lon, _ = random.choices(CITIES, weights)[0]
+                latitude = city_lat + random.gauss(0, 0.15)
+                longitude = city_lon + random.gauss(0, 0.15)
+                geohash = encode_geohash(latitude, longitude)
+
+            profiles.append({
+                'id': str(uuid.uuid4()), 'user_id': user_id, 'full_name': f'测试用户{i}',
+                'age': min(max(int(random.gauss(28, 6)), 18), 70),
+                'latitude': latitude, 'longitude': longitude, 'geohash': geohash,
+                'profile_visible': random.random() < 0.9, 'location_visible': random.random() < 0.85,
+                'contact_visible': False, 'updated_at': now,
+            })
+        yield users, profiles
+
+
+def summarize(name, latencies, elapsed):
+    latencies_ms = np.array(latencies) * 1000
+    p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99])
+    print(f"{name:<28}{p50:>10.2f}{p90:>10.2f}{p99:>10.2f}{latencies_ms.max():>10.2f}"
+          f"{len(latencies) / elapsed:>12.1f}")
+
+
+def timed(func, count):
+    """调用 func(i) count 次，返回 (每次耗时列表, 总耗时)"""
+    latencies = []
+    started = time.perf_counter()
+    for i in range(count):
+        call_started = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - call_started)
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合成用户规模下的热点路径基准测试')
+    parser.add_argument('--profiles', type=int, default=10000, help='生成的用户数，如 10000 / 100000 / 1000000')
+    parser.add_argument('--requests', type=int, default=200, help='每个路由的请求次数')
+    parser.add_argument('--viewers', type=int, default=20, help='随机选取多少个已登录用户发起请求')
+    parser.add_argument('--recommendations', action='store_true', help='先运行离线推荐任务再测 /matching')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        from app import (User, UserProfile, app, build_recommendations, create_tables, db,
+                         last_login_buffer, match_cache, password_hasher, profile_store)
+        from matching_algorithm import calculate_match_score
+
+        # 模板放在仓库根目录而不是 templates/ 下，渲染页面前指定模板目录
+        app.template_folder = ROOT_DIR
+        create_tables()
+
+        # 所有合成用户共用一个按当前配置计算的哈希，登录测试的成本与线上一致
+        password_hash = password_hasher.hash(PASSWORD)
+        started = time.perf_counter()
+        with app.app_context():
+            for users, profiles in generate_profiles(args.profiles, password_hash):
+                db.session.execute(User.__table__.insert(), users)
+                db.session.execute(UserProfile.__table__.insert(), profiles)
+                db.session.commit()
+            db.session.execute(db.text('ANALYZE'))
+            print(f"生成 {args.profiles} 个用户耗时 {time.perf_counter() - started:.1f} 秒")
+
+            started = time.perf_counter()
+            profile_store.load()
+            print(f"加载内存资料库耗时 {time.perf_counter() - started:.1f} 秒")
+
+            if args.recommendations:
+                started = time.perf_counter()
+                build_recommendations(full=True)
+                print(f"离线推荐耗时 {time.perf_counter() - started:.1f} 秒")
+
+            viewer_indexes = random.sample(range(args.profiles), min(args.viewers, args.profiles))
+            candidates = UserProfile.query.limit(10000).all()
+            viewer_profile = UserProfile.query.filter(UserProfile.latitude.isnot(None)).first()
+
+        clients = []
+        for index in viewer_indexes:
+            client = app.test_client()
+            client.post('/login', data={'username': f'bench{index}', 'password': PASSWORD})
+            clients.append(client)
+
+        def get(path, clear_cache=False):
+            def request(i):
+                if clear_cache:
+                    match_cache.clear()
+                response = clients[i % len(clients)].get(path)
+                assert response.status_code in (200, 302), f'{path} -> {response.status_code}'
+            return request
+
+        def login(i):
+            index = random.randrange(args.profiles)
+            response = app.test_client().post(
+                '/login', data={'username': f'bench{index}', 'password': PASSWORD})
+            assert response.status_code == 302
+
+        print(f"{'':<28}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'次/秒':>12}")
+
+        latencies, elapsed = timed(
+            lambda i: calculate_match_score(viewer_profile, candidates[i % len(candidates)]),
+            args.requests * 100)
+        summarize('calculate_match_score', latencies, elapsed)
+
+        summarize('/nearby', *timed(get('/nearby'), args.requests))
+        summarize('/matching（未命中缓存）', *timed(get('/matching', clear_cache=True), args.requests))
+        summarize('/matching（命中缓存）', *timed(get('/matching'), args.requests))
+        summarize('/login', *timed(login, max(args.requests // 10, 1)))
+
+        last_login_buffer.stop()
+        with app.app_context():
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/query_counts.py
+"""
+统计已登录用户访问各个页面时执行的SQL语句数量
+
+用法: python benchmarks/query_counts.py [-v]
+使用临时 SQLite 数据库和测试账号 demo，超过预期语句数时以非零状态退出
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from sqlalchemy import event
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+# 每个页面允许的SQL语句数（第一次访问 /dashboard 统计待处理请求数、/matching 未命中缓存，第二次命中）
+# /nearby 和实时匹配在内存资料库中筛选打分，只为当前页加载完整资料
+# 路径中的 {用户名} 替换为该测试账号的用户ID
+EXPECTED_QUERIES = [
+    ('/dashboard', 2),
+    ('/dashboard', 1),
+    ('/profile', 1),
+    ('/edit_profile', 1),
+    ('/nearby', 2),
+    ('/api/nearby', 2),
+    ('/matching', 4),
+    ('/matching', 1),
+    ('/api/matches', 1),
+    ('/api/conversations/{test}/messages', 2),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='统计每个页面的SQL语句数')
+    parser.add_argument('-v', '--verbose', action='store_true', help='打印每条SQL语句')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        from app import User, app, create_tables, db, last_login_buffer, profile_store
+
+        # 模板放在仓库根目录而不是 templates/ 下，渲染页面前指定模板目录
+        app.template_folder = ROOT_DIR
+        create_tables()
+        with app.app_context():
+            # 内存资料库在启动时加载，不计入页面的语句数
+            profile_store.load()
+            user_ids = dict(db.session.query(User.username, User.id))
+        client = app.test_client()
+        client.post('/login', data={'username': 'demo', 'password': 'password123'})
+
+        statements = []
+        with app.app_context():
+            engine = db.engine
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', record)
+
+        failed = False
+        for path, expected in EXPECTED_QUERIES:
+            path = path.format(**user_ids)
+            statements.clear()
+            response = client.get(path)
+            ok = len(statements) <= expected
+            failed = failed or not ok
+
+            print(f"{'✅' if ok else '❌'} {path}: {len(statements)} 条SQL（预期不超过 {expected}），状态码 {response.status_code}")
+            if args.verbose or not ok:
+                for statement in statements:
+                    print(f"      {' '.join(statement.split())[:160]}")
+
+        event.remove(engine, 'before_cursor_execute', record)
+        # 临时数据库删除前写入缓冲的登录时间
+        last_login_buffer.stop()
+        engine.dispose()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
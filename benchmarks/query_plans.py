@@ -0,0 +1,158 @@
+# benchmarks/query_plans.py
+"""
+对比添加索引前后热点查询的执行计划和耗时
+附近的人和实时匹配在内存资料库（ProfileStore）中筛选打分，这里测的是它们仍然会发出的数据库查询：
+增量同步、已匹配用户、按页加载资料，以及离线推荐和待处理请求数
+
+用法: python benchmarks/query_plans.py --profiles 10000 --matches 10000
+在临时 SQLite 数据库中生成数据，先去掉所有二级索引测一遍，再执行 upgrade_schema() 后测一遍
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select, union
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (Match, Recommendation, User, UserProfile, app, db, not_matched_with, upgrade_schema)
+from profile_store import REFRESH_OVERLAP
+from geolocation import encode_geohash
+
+# 模拟用户集中在几个城市附近
+CITIES = [(39.9042, 116.4074), (31.2304, 121.4737), (23.1291, 113.2644), (30.5728, 104.0668)]
+
+
+def populate(engine, profile_count, match_count):
+    """生成用户、资料、匹配记录和离线推荐"""
+    now = datetime.utcnow()
+    user_ids = [str(uuid.uuid4()) for _ in range(profile_count)]
+
+    users = [{'id': user_id, 'username': f'user{i}', 'email': f'user{i}@example.com',
+              'password_hash': 'x'} for i, user_id in enumerate(user_ids)]
+
+    profiles = []
+    for user_id in user_ids:
+        lat, lon = random.choice(CITIES)
+        lat += random.gauss(0, 0.3)
+        lon += random.gauss(0, 0.3)
+        profiles.append({
+            'id': str(uuid.uuid4()), 'user_id': user_id, 'age': random.randint(18, 60),
+            'latitude': lat, 'longitude': lon, 'geohash': encode_geohash(lat, lon),
+            'profile_visible': random.random() < 0.9, 'location_visible': random.random() < 0.8,
+            # 大部分资料一天内没有修改，增量同步只会读到最近修改的少数几行
+            'updated_at': now - timedelta(seconds=random.expovariate(1 / 86400)),
+        })
+
+    matches = [{'id': str(uuid.uuid4()), 'user_id': random.choice(user_ids),
+                'matched_user_id': random.choice(user_ids),
+                'status': random.choice(['pending', 'accepted', 'rejected'])}
+               for _ in range(match_count)]
+
+    recommendations = [{'id': str(uuid.uuid4()), 'user_id': user_id, 'recommended_user_id': random.choice(user_ids),
+                        'rank': rank, 'match_score': 100 - rank}
+                       for user_id in user_ids for rank in range(1, 6)]
+
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), users)
+        conn.execute(insert(UserProfile.__table__), profiles)
+        conn.execute(insert(Match.__table__), matches)
+        conn.execute(insert(Recommendation.__table__), recommendations)
+
+    return user_ids
+
+
+def hot_queries(user_ids):
+    """各个路由上的热点查询，与 app.py 中对应函数发出的语句相同"""
+    user_id = user_ids[0]
+    page_ids = random.sample(user_ids, 20)
+    return {
+        '加载当前用户资料': select(UserProfile).where(UserProfile.user_id == user_id),
+        # load_profile_rows(since)：内存资料库每隔 PROFILE_STORE_REFRESH_INTERVAL 秒的增量同步
+        '资料增量同步': select(
+            UserProfile.user_id, UserProfile.age, UserProfile.latitude, UserProfile.longitude,
+            UserProfile.profile_visible, UserProfile.location_visible
+        ).where(UserProfile.updated_at >= datetime.utcnow() - REFRESH_OVERLAP),
+        # matched_among：实时匹配时只检查排名靠前的候选人是否已有匹配关系
+        '候选人匹配关系': union(
+            select(Match.matched_user_id).where(Match.user_id == user_id, Match.matched_user_id.in_(page_ids),
+                                                Match.status != 'rejected'),
+            select(Match.user_id).where(Match.matched_user_id == user_id, Match.user_id.in_(page_ids),
+                                        Match.status != 'rejected'),
+        ),
+        # load_profiles：附近的人和匹配推荐只为当前页加载完整资料
+        '按页加载资料': select(UserProfile).where(UserProfile.user_id.in_(page_ids)),
+        # load_recommendations：读取离线推荐
+        '离线推荐': select(Recommendation.id, UserProfile.id).join(
+            UserProfile, UserProfile.user_id == Recommendation.recommended_user_id
+        ).where(
+            Recommendation.user_id == user_id,
+            UserProfile.profile_visible == True,
+            not_matched_with(user_id)
+        ).order_by(Recommendation.rank),
+        '待处理匹配请求数': select(func.count()).select_from(Match).where(
+            Match.matched_user_id == user_id,
+            Match.status == 'pending'
+        ),
+    }
+
+
+def report(engine, queries, repeat):
+    with engine.connect() as conn:
+        for name, statement in queries.items():
+            sql = str(statement.compile(engine, compile_kwargs={'literal_binds': True}))
+            plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+
+            # 没有索引时部分查询很慢，累计超过 2 秒就不再重复
+            runs = 0
+            started = time.perf_counter()
+            while runs < repeat and (runs == 0 or time.perf_counter() - started < 2):
+                conn.execute(statement).fetchall()
+                runs += 1
+            elapsed_ms = (time.perf_counter() - started) / runs * 1000
+
+            print(f"  {name}: {elapsed_ms:.2f} ms")
+            for row in plan:
+                print(f"      {row[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比添加索引前后的查询计划')
+    parser.add_argument('--profiles', type=int, default=10000)
+    parser.add_argument('--matches', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as tmpdir, app.app_context():
+        engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'bench.db')}")
+
+        # 模拟旧库：只有主键和唯一约束
+        db.metadata.create_all(engine)
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(engine)
+
+        user_ids = populate(engine, args.profiles, args.matches)
+        queries = hot_queries(user_ids)
+
+        print(f"数据量: {args.profiles} 个资料, {args.matches} 条匹配记录")
+        print("=== 添加索引前 ===")
+        report(engine, queries, args.repeat)
+
+        for change in upgrade_schema(engine):
+            print(f"  {change}")
+
+        print("=== 添加索引后 ===")
+        report(engine, queries, args.repeat)
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/streamlit_auth.py
+"""
+测量 Streamlit 前端登录和注册在不同用户规模下的耗时，验证按用户名/邮箱的索引查询不随用户数增长
+
+用法: python benchmarks/streamlit_auth.py --sizes 1000 10000 100000 --requests 500
+每个规模生成一个临时 SQLite 数据库，分别统计：
+  - 按用户名查用户（登录）、一次查询检查用户名和邮箱是否重复（注册）、创建用户和资料的 SQL 耗时
+  - 旧实现在内存字典中逐个比较用户名的耗时，作为对照
+  - 一次完整登录（查询 + 一次密码校验）的耗时
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.population import PASSWORD, generate_profiles
+from config import Config
+from passwords import ThrottledPasswordHasher
+from streamlit_storage import StreamlitStorage, create_storage_engine, profiles_table, users_table
+
+
+def timed(func, count):
+    """调用 func(i) count 次，返回 p50 毫秒"""
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - started)
+    return float(np.percentile(np.array(latencies) * 1000, 50))
+
+
+def seed(storage, count, password_hash):
+    with storage.engine.begin() as conn:
+        for users, profiles in generate_profiles(count, password_hash):
+            conn.execute(users_table.insert(), users)
+            conn.execute(profiles_table.insert(), profiles)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streamlit 登录/注册随用户规模的耗时')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--requests', type=int, default=500, help='每项测量的次数')
+    parser.add_argument('--method', default=Config.PASSWORD_HASH_METHOD, help='密码哈希方法')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    hasher = ThrottledPasswordHasher(method=args.method, max_concurrent=1)
+    password_hash = hasher.hash(PASSWORD)
+
+    print(f"{'用户数':>10}{'登录查询':>12}{'重复检查':>12}{'创建用户':>12}{'逐个比较':>12}{'完整登录':>12}  (p50 毫秒)")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in args.sizes:
+            storage = StreamlitStorage(create_storage_engine(f"sqlite:///{os.path.join(tmpdir, f'{size}.db')}"))
+            seed(storage, size, password_hash)
+            usernames = [f'bench{random.randrange(size)}' for _ in range(args.requests)]
+
+            lookup_ms = timed(lambda i: storage.get_user_by_username(usernames[i]), args.requests)
+            conflict_ms = timed(lambda i: storage.find_conflicts(f'new{i}', f'new{i}@example.com'), args.requests)
+            create_ms = timed(lambda i: storage.create_user(f'new{i}', f'new{i}@example.com', password_hash),
+                              args.requests)
+
+            # 旧实现：所有用户放在会话字典里，登录时逐个比较用户名
+            users = {f'id{i}': {'username': f'bench{i}'} for i in range(size)}
+            scan_ms = timed(lambda i: next(user for user in users.values() if user['username'] == usernames[i]),
+                            args.requests)
+
+            def login(i):
+                user = storage.get_user_by_username(usernames[i])
+                assert hasher.verify(user['password_hash'], PASSWORD)
+
+            login_ms = timed(login, min(args.requests, 50))
+
+            print(f"{size:>10}{lookup_ms:>14.3f}{conflict_ms:>14.3f}{create_ms:>14.3f}{scan_ms:>14.3f}"
+                  f"{login_ms:>14.2f}")
+            storage.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# bulk_import.py
+import csv
+import json
+import math
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+from auth import validate_email
+from geolocation import encode_geohash
+
+# 资料表中可以直接导入的字段
+PROFILE_FIELDS = ('full_name', 'gender', 'bio', 'phone', 'wechat')
+
+# 无法解析的行，由 prepare_batch 计入无效数，不中断整个文件的导入
+InvalidRecord = namedtuple('InvalidRecord', 'line_number reason')
+
+
+def read_records(path):
+    """按行流式读取 CSV（带表头）或 JSONL 文件，逐条返回字典，无法解析的行返回 InvalidRecord"""
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith('.jsonl'):
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    yield InvalidRecord(line_number, '不是有效的 JSON')
+                    continue
+                if isinstance(record, dict):
+                    yield record
+                else:
+                    yield InvalidRecord(line_number, '不是 JSON 对象')
+        else:
+            yield from csv.DictReader(f)
+
+
+def read_batches(records, batch_size):
+    """将记录按 batch_size 分批"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _optional(value, convert):
+    if value is None or value == '':
+        return None
+    return convert(value)
+
+
+def _text(value):
+    """JSONL 中的字段可能是数字等非字符串类型，统一转换为去掉首尾空白的字符串"""
+    return '' if value is None else str(value).strip()
+
+
+def _coordinate(value, limit):
+    coordinate = _optional(value, float)
+    if coordinate is not None and not (math.isfinite(coordinate) and -limit <= coordinate <= limit):
+        raise ValueError(f'坐标超出范围: {value}')
+    return coordinate
+
+
+def prepare_batch(task):
+    """
+    进程池工作函数：校验一批记录、计算密码哈希并生成 users / user_profiles 表的行
+    task 为 (records, hash_method)，返回 (user_rows, profile_rows, errors)
+    记录可以提供明文 password，也可以直接提供已哈希的 password_hash
+    无法解析的行（InvalidRecord）和格式不正确的记录都放入 errors
+    """
+    records, hash_method = task
+    now = datetime.utcnow()
+    user_rows, profile_rows, errors = [], [], []
+
+    for record in records:
+        if isinstance(record, InvalidRecord):
+            errors.append((f'第 {record.line_number} 行', record.reason))
+            continue
+
+        try:
+            user_row, profile_row = _prepare_record(record, hash_method, now)
+        except ValueError as e:
+            errors.append((_text(record.get('username')), str(e)))
+            continue
+        except Exception as e:  # 单条记录出错只跳过这一条，不中断整个文件
+            errors.append((_text(record.get('username')), f'无法导入: {e}'))
+            continue
+
+        user_rows.append(user_row)
+        profile_rows.append(profile_row)
+
+    return user_rows, profile_rows, errors
+
+
+def _prepare_record(record, hash_method, now):
+    """校验一条记录，返回 (user_row, profile_row)，记录无效时抛出 ValueError"""
+    username = _text(record.get('username'))
+    email = _text(record.get('email'))
+    password = record.get('password')
+    password = '' if password is None else str(password)
+    password_hash = _text(record.get('password_hash'))
+
+    if not username:
+        raise ValueError('缺少用户名')
+    if not validate_email(email):
+        raise ValueError('邮箱格式不正确')
+    if not password and not password_hash:
+        raise ValueError('缺少密码')
+
+    try:
+        age = _optional(record.get('age'), int)
+        latitude = _coordinate(record.get('latitude'), 90)
+        longitude = _coordinate(record.get('longitude'), 180)
+    except (TypeError, ValueError):
+        raise ValueError('年龄或经纬度格式不正确')
+
+    user_id = str(uuid.uuid4())
+    user_row = {
+        'id': user_id,
+        'username': username,
+        'email': email,
+        'password_hash': password_hash or generate_password_hash(password, hash_method),
+        'created_at': now,
+        'last_login': now,
+    }
+
+    profile_row = {
+        'id': str(uuid.uuid4()),
+        'user_id': user_id,
+        'age': age,
+        'latitude': latitude,
+        'longitude': longitude,
+        'geohash': encode_geohash(latitude, longitude)
+        if latitude is not None and longitude is not None else None,
+        'updated_at': now,
+    }
+    for field in PROFILE_FIELDS:
+        profile_row[field] = _text(record.get(field)) or None
+    return user_row, profile_row
@@ -1,15 +1,86 @@
-# config.py
-import os
-
-basedir = os.path.abspath(os.path.dirname(__file__))
-
-
-class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-12345-change-in-production'
-
-    # 修复数据库URI配置
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
-                              f"sqlite:///{os.path.join(basedir, 'dating_app.db')}"
-
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ECHO = False  # 设置为True可以查看SQL语句，调试用
\ No newline at end of file
+# config.py
+import os
+
+from sqlalchemy.engine import make_url
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+
+def engine_options(database_uri):
+    """
+    连接池参数：只有使用 QueuePool 的数据库才设置池大小
+    内存 SQLite（sqlite://、sqlite:///:memory:）使用 StaticPool / SingletonThreadPool，传入池大小参数会报 TypeError
+    """
+    options = {'pool_pre_ping': True}
+    url = make_url(database_uri)
+    in_memory = url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory')
+    if not in_memory:
+        options.update({
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        })
+    return options
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-12345-change-in-production'
+
+    # 修复数据库URI配置
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
+                              f"sqlite:///{os.path.join(basedir, 'dating_app.db')}"
+
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ECHO = False  # 设置为True可以查看SQL语句，调试用
+
+    # 连接池大小，多个工作线程并发读时按需调整
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # 每个新建的SQLite连接都会执行的PRAGMA
+    # WAL 模式下读写互不阻塞，busy_timeout 让写锁冲突时等待而不是直接报 database is locked
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # 毫秒
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # 字节
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),  # 负数表示KB，约64MB
+    }
+
+    MATCH_CACHE_SIZE = 10000  # 最多缓存多少个用户的推荐列表
+    MATCH_CACHE_TTL = 300  # 推荐列表缓存时间（秒）
+    RECOMMENDATIONS_PER_USER = 20  # 离线任务为每个用户保存的推荐数量
+    MATCH_LIST_SIZE = 100  # 没有离线推荐时实时计算并缓存的推荐列表长度，默认半径下翻页最多到这里
+    PENDING_COUNT_CACHE_SIZE = 100000  # 最多缓存多少个用户的待处理匹配请求数
+    PENDING_COUNT_CACHE_TTL = 600  # 待处理请求数的缓存时间（秒），过期后重新统计，纠正其他进程的修改
+
+    # 密码哈希算法及成本参数（Werkzeug 格式），修改后用户下次登录时自动按新参数重新哈希
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    PASSWORD_HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', 4))  # 同时进行的哈希计算数上限，超出的请求排队等待
+
+    # 最近登录时间先写入内存，后台线程按间隔或累计条数批量更新
+    LAST_LOGIN_FLUSH_INTERVAL = int(os.environ.get('LAST_LOGIN_FLUSH_INTERVAL', 5))  # 秒
+    LAST_LOGIN_FLUSH_BATCH_SIZE = int(os.environ.get('LAST_LOGIN_FLUSH_BATCH_SIZE', 500))
+
+    # 请求级性能统计（路由耗时、SQL条数和耗时），默认关闭
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', '').lower() in ('1', 'true', 'yes')
+    SLOW_REQUEST_MS = int(os.environ['SLOW_REQUEST_MS']) if os.environ.get('SLOW_REQUEST_MS') else None  # 超过该耗时打印慢请求日志
+    # 可以访问 /admin/metrics 的用户名（逗号分隔），Prometheus 抓取时也可以带 Bearer 令牌
+    ADMIN_USERNAMES = [name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()]
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # 附近的人 / 匹配推荐 API 的分页参数
+    API_PAGE_SIZE = 20  # 默认每页条数
+    API_MAX_PAGE_SIZE = 100  # 每页条数上限
+    API_MAX_RADIUS_KM = 200  # 搜索半径上限（公里）
+
+    # 内存资料库从数据库增量同步其他进程修改的间隔（秒）
+    PROFILE_STORE_REFRESH_INTERVAL = int(os.environ.get('PROFILE_STORE_REFRESH_INTERVAL', 30))
+
+    # 私信与实时事件流（SSE）
+    # 每个打开的页面占一个长连接，单个进程要支撑上千个连接时用协程 worker 运行，如 gunicorn -k gevent
+    MESSAGE_MAX_LENGTH = 2000  # 单条消息的字数上限
+    EVENT_STREAM_HEARTBEAT = int(os.environ.get('EVENT_STREAM_HEARTBEAT', 15))  # 心跳间隔（秒），防止代理断开空闲连接
+    EVENT_STREAM_TIMEOUT = int(os.environ.get('EVENT_STREAM_TIMEOUT', 300))  # 单次连接时长（秒），到期后浏览器自动重连
+    EVENT_STREAM_QUEUE_SIZE = 100  # 每个连接最多积压的事件数，超过后断开，客户端重连时从数据库补齐
+    EVENT_STREAM_BACKFILL_LIMIT = 100  # 重连时最多补发的消息数，更早的通过消息列表接口获取
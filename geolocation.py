@@ -1,27 +1,205 @@
-# utils/geolocation.py
-from math import radians, sin, cos, sqrt, atan2
-
-
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """
-    计算两个坐标点之间的距离（公里）
-    使用Haversine公式
-    """
-    if not all([lat1, lon1, lat2, lon2]):
-        return float('inf')
-
-    R = 6371  # 地球半径，单位公里
-
-    lat1_rad = radians(lat1)
-    lon1_rad = radians(lon1)
-    lat2_rad = radians(lat2)
-    lon2_rad = radians(lon2)
-
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
-
-    a = sin(dlat / 2) ** 2 + cos(lat1_rad) * cos(lat2_rad) * sin(dlon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-
-    distance = R * c
-    return distance
\ No newline at end of file
+# utils/geolocation.py
+from math import radians, degrees, sin, cos, sqrt, atan2, asin
+
+import numpy as np
+
+# 地球半径，单位公里
+EARTH_RADIUS_KM = 6371
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """
+    计算两个坐标点之间的距离（公里）
+    使用Haversine公式
+    """
+    if not all([lat1, lon1, lat2, lon2]):
+        return float('inf')
+
+    R = EARTH_RADIUS_KM
+
+    lat1_rad = radians(lat1)
+    lon1_rad = radians(lon1)
+    lat2_rad = radians(lat2)
+    lon2_rad = radians(lon2)
+
+    dlon = lon2_rad - lon1_rad
+    dlat = lat2_rad - lat1_rad
+
+    a = sin(dlat / 2) ** 2 + cos(lat1_rad) * cos(lat2_rad) * sin(dlon / 2) ** 2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    distance = R * c
+    return distance
+
+
+def calculate_distances(lat, lon, latitudes, longitudes):
+    """
+    批量计算一个坐标点到多个坐标点的距离（公里），返回numpy数组
+    与 calculate_distance 语义一致：任一坐标缺失（None/0）时距离为 inf
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+
+    distances = np.full(latitudes.shape, np.inf)
+    if not all([lat, lon]):
+        return distances
+
+    # None 转换为 nan，与 0 一起视为缺失
+    valid = (np.isfinite(latitudes) & np.isfinite(longitudes) &
+             (latitudes != 0) & (longitudes != 0))
+    if not valid.any():
+        return distances
+
+    lat1_rad = radians(lat)
+    lon1_rad = radians(lon)
+    lat2_rad = np.radians(latitudes[valid])
+    lon2_rad = np.radians(longitudes[valid])
+
+    dlon = lon2_rad - lon1_rad
+    dlat = lat2_rad - lat1_rad
+
+    a = np.sin(dlat / 2) ** 2 + cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    distances[valid] = EARTH_RADIUS_KM * c
+    return distances
+
+# geohash 编码使用的 base32 字符表
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# 存储在用户资料上的 geohash 精度（7位约 150m x 150m）
+GEOHASH_PRECISION = 7
+
+# 单次附近查询最多覆盖的 geohash 单元数量
+GEOHASH_MAX_CELLS = 32
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    将经纬度编码为 geohash 字符串
+    前缀相同的 geohash 位于同一个网格单元内，可直接用于范围查询
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True  # 偶数位编码经度，奇数位编码纬度
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(geohash)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    计算包含以 (latitude, longitude) 为中心、radius_km 为半径圆的经纬度矩形
+    返回 (min_lat, max_lat, min_lon, max_lon)，单位为度
+    经度范围可能超出 [-180, 180]（跨越180度经线），覆盖两极时经度范围为整圈
+    """
+    angular_radius = radius_km / EARTH_RADIUS_KM
+    lat_rad = radians(latitude)
+
+    min_lat = lat_rad - angular_radius
+    max_lat = lat_rad + angular_radius
+
+    if min_lat > -radians(90) and max_lat < radians(90):
+        lon_delta = degrees(asin(min(sin(angular_radius) / cos(lat_rad), 1.0)))
+    else:
+        # 圆覆盖了极点，经度不受限制
+        min_lat = max(min_lat, -radians(90))
+        max_lat = min(max_lat, radians(90))
+        lon_delta = 180.0
+
+    return degrees(min_lat), degrees(max_lat), longitude - lon_delta, longitude + lon_delta
+
+
+def geohash_bounds(geohash):
+    """
+    返回 geohash 单元的边界 (min_lat, max_lat, min_lon, max_lon)
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def geohash_cell_size(precision):
+    """
+    返回指定精度下单个 geohash 单元的 (纬度跨度, 经度跨度)，单位为度
+    """
+    total_bits = precision * 5
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_cells(latitude, longitude, radius_km, max_cells=GEOHASH_MAX_CELLS):
+    """
+    计算覆盖以 (latitude, longitude) 为中心、radius_km 为半径区域的 geohash 单元前缀
+    自动选择单元数量不超过 max_cells 的最高精度
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_lat, cell_lon = geohash_cell_size(precision)
+        row_count = int(180.0 / cell_lat)
+        col_count = int(360.0 / cell_lon)
+
+        first_row = min(int((min_lat + 90.0) // cell_lat), row_count - 1)
+        last_row = min(int((max_lat + 90.0) // cell_lat), row_count - 1)
+        if max_lon - min_lon >= 360.0:
+            first_col, last_col = 0, col_count - 1
+        else:
+            first_col = int((min_lon + 180.0) // cell_lon)
+            last_col = int((max_lon + 180.0) // cell_lon)
+
+        if (last_row - first_row + 1) * (last_col - first_col + 1) <= max_cells or precision == 1:
+            break
+
+    cells = set()
+    for row in range(first_row, last_row + 1):
+        center_lat = -90.0 + (row + 0.5) * cell_lat
+        for col in range(first_col, last_col + 1):
+            # 跨越180度经线时按列数取模回绕
+            center_lon = -180.0 + ((col % col_count) + 0.5) * cell_lon
+            cells.add(encode_geohash(center_lat, center_lon, precision))
+
+    return sorted(cells)
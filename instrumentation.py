@@ -0,0 +1,143 @@
+# instrumentation.py
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# 耗时直方图的分桶上限（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# 每个请求SQL语句数的分桶上限
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+# 慢请求日志中最多记录的SQL语句数
+MAX_LOGGED_STATEMENTS = 50
+
+
+class Histogram:
+    """累积分桶直方图，与 Prometheus histogram 的语义一致"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class RequestMetrics:
+    """
+    按路由汇总请求的总耗时、SQL语句数、SQL耗时和Python耗时
+    只在内存中累计，进程重启后清零
+    """
+
+    HISTOGRAMS = (
+        ('http_request_duration_seconds', '请求总耗时', DURATION_BUCKETS),
+        ('http_request_sql_duration_seconds', '请求内SQL执行耗时', DURATION_BUCKETS),
+        ('http_request_python_duration_seconds', '请求内SQL以外的耗时', DURATION_BUCKETS),
+        ('http_request_sql_statements', '请求内执行的SQL语句数', STATEMENT_BUCKETS),
+    )
+
+    def __init__(self):
+        self._histograms = {name: defaultdict(lambda b=buckets: Histogram(b))
+                            for name, _, buckets in self.HISTOGRAMS}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, total_time, sql_count, sql_time):
+        labels = (route, method)
+        values = {
+            'http_request_duration_seconds': total_time,
+            'http_request_sql_duration_seconds': sql_time,
+            'http_request_python_duration_seconds': max(total_time - sql_time, 0.0),
+            'http_request_sql_statements': sql_count,
+        }
+        with self._lock:
+            for name, value in values.items():
+                self._histograms[name][labels].observe(value)
+
+    def render_prometheus(self):
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            for name, help_text, _ in self.HISTOGRAMS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (route, method), histogram in sorted(self._histograms[name].items()):
+                    labels = f'route="{route}",method="{method}"'
+                    for upper, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{{labels},le="{upper}"}} {count}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.total}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.total}')
+        return '\n'.join(lines) + '\n'
+
+
+class RequestInstrumentation:
+    """
+    通过 Flask 请求钩子和 SQLAlchemy 引擎事件统计每个请求的耗时和SQL
+    slow_request_ms 不为 None 时，超过该耗时的请求会连同执行的SQL一起打印出来
+    """
+
+    def __init__(self, app, engine, metrics=None, slow_request_ms=None):
+        self.metrics = metrics if metrics is not None else RequestMetrics()
+        self.slow_request_ms = slow_request_ms
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def _start_request(self):
+        g.request_started = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+        g.sql_statements = []
+
+    def _finish_request(self, response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+
+        total_time = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        self.metrics.observe(route, request.method, total_time, g.sql_count, g.sql_time)
+
+        if self.slow_request_ms is not None and total_time * 1000 >= self.slow_request_ms:
+            print(f"⚠️ 慢请求 {request.method} {route} {response.status_code}: "
+                  f"总耗时 {total_time * 1000:.1f}ms，SQL {g.sql_count} 条 {g.sql_time * 1000:.1f}ms")
+            for elapsed, statement in g.sql_statements:
+                print(f"    {elapsed * 1000:8.2f}ms  {' '.join(statement.split())}")
+
+        return response
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # 后台线程（如登录时间批量写入）执行的SQL不属于任何请求
+        if has_request_context() and 'request_started' in g:
+            conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        query_started = conn.info.get('query_started')
+        if not query_started or not has_request_context() or 'request_started' not in g:
+            return
+
+        elapsed = time.perf_counter() - query_started.pop()
+        g.sql_count += 1
+        g.sql_time += elapsed
+        if len(g.sql_statements) < MAX_LOGGED_STATEMENTS:
+            g.sql_statements.append((elapsed, statement))
+
+    @staticmethod
+    def _handle_error(exception_context):
+        # 语句执行失败时不会触发 after_cursor_execute，丢弃对应的开始时间
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('query_started'):
+            connection.info['query_started'].pop()
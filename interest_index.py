@@ -0,0 +1,77 @@
+# interest_index.py
+import threading
+
+# 可选的兴趣标签，位置即该兴趣在位集中的位
+INTERESTS_OPTIONS = ["运动", "音乐", "阅读", "旅行", "电影", "美食", "摄影", "游戏",
+                     "编程", "艺术", "科技", "健身", "咖啡", "宠物", "购物"]
+
+INTEREST_BITS = {name: 1 << i for i, name in enumerate(INTERESTS_OPTIONS)}
+
+
+def interests_to_mask(interests):
+    """兴趣列表转换为位集，不在 INTERESTS_OPTIONS 中的标签忽略"""
+    mask = 0
+    for name in interests or ():
+        mask |= INTEREST_BITS.get(name, 0)
+    return mask
+
+
+def mask_to_interests(mask):
+    """位集转换为兴趣列表，顺序与 INTERESTS_OPTIONS 一致"""
+    return [name for name, bit in INTEREST_BITS.items() if mask & bit]
+
+
+def count_interests(mask):
+    """位集中的兴趣数量"""
+    return bin(mask).count('1')
+
+
+class InterestIndex:
+    """
+    兴趣 -> 用户ID 的倒排索引，同时保存每个用户兴趣的位集
+    匹配时只需要遍历与当前用户至少有一个共同兴趣的用户
+    可以被多个会话（线程）共用，读写都在锁内进行
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users_by_interest = {name: set() for name in INTERESTS_OPTIONS}
+        self._masks = {}
+
+    def __len__(self):
+        return len(self._masks)
+
+    def update(self, user_id, interests):
+        """设置用户的兴趣（覆盖原有兴趣），注册和修改资料时调用"""
+        self.update_mask(user_id, interests_to_mask(interests))
+
+    def update_mask(self, user_id, new_mask):
+        """直接用位集设置用户的兴趣，从数据库加载时使用"""
+        with self._lock:
+            old_mask = self._masks.get(user_id, 0)
+            for name, bit in INTEREST_BITS.items():
+                if old_mask & bit and not new_mask & bit:
+                    self._users_by_interest[name].discard(user_id)
+                elif new_mask & bit and not old_mask & bit:
+                    self._users_by_interest[name].add(user_id)
+
+            if new_mask:
+                self._masks[user_id] = new_mask
+            else:
+                self._masks.pop(user_id, None)
+
+    def remove(self, user_id):
+        self.update(user_id, ())
+
+    def mask(self, user_id):
+        return self._masks.get(user_id, 0)
+
+    def overlaps(self, user_id):
+        """返回 {其他用户ID: 共同兴趣位集}，只包含至少有一个共同兴趣的用户"""
+        with self._lock:
+            mask = self._masks.get(user_id, 0)
+            candidates = set()
+            for name in mask_to_interests(mask):
+                candidates |= self._users_by_interest[name]
+            candidates.discard(user_id)
+            return {other_id: self._masks[other_id] & mask for other_id in candidates}
@@ -0,0 +1,77 @@
+# login_tracker.py
+import atexit
+import threading
+
+
+class LastLoginBuffer:
+    """
+    在内存中收集用户最近登录时间，由后台线程按时间间隔或数量阈值批量写入数据库
+    登录请求只需要更新字典，不再等待数据库提交
+    """
+
+    def __init__(self, flush_callback, interval=5, batch_size=500):
+        self.flush_callback = flush_callback  # 接收 {user_id: 登录时间} 并写入数据库
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(self, user_id, timestamp):
+        """记录一次登录，同一用户只保留最新的时间"""
+        with self._lock:
+            self._merge({user_id: timestamp})
+            pending_count = len(self._pending)
+            if self._thread is None and not self._stopped.is_set():
+                self._start()
+
+        if pending_count >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """立即写入所有待写入的登录时间，返回写入的条数"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            try:
+                self.flush_callback(pending)
+            except Exception as e:
+                # 写入失败时放回缓冲区，下次再试
+                with self._lock:
+                    self._merge(pending)
+                print(f"登录时间写入失败: {e}")
+                return 0
+
+            return len(pending)
+
+    def stop(self):
+        """停止后台线程并写入剩余数据，进程退出时自动调用"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+
+    def _merge(self, entries):
+        """合并登录时间，保留较新的值（调用方需持有锁）"""
+        for user_id, timestamp in entries.items():
+            current = self._pending.get(user_id)
+            if current is None or timestamp > current:
+                self._pending[user_id] = timestamp
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='last-login-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
@@ -0,0 +1,167 @@
+# match_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCacheStore:
+    """
+    进程内LRU缓存，每个条目带过期时间
+    MatchCache 只依赖 get/set/delete 三个方法，可以替换为其他实现相同接口的存储
+    on_evict(key) 在条目因容量淘汰或过期被移除时调用（不含 delete），调用时不持有锁
+    """
+
+    def __init__(self, max_size=10000, ttl=300, clock=time.monotonic, on_evict=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+
+            expires_at, value = item
+            if expires_at > self.clock():
+                self._data.move_to_end(key)
+                return value
+
+            del self._data[key]
+
+        self._evicted([key])
+        return None
+
+    def set(self, key, value):
+        evicted = []
+        with self._lock:
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                evicted.append(self._data.popitem(last=False)[0])
+        self._evicted(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _evicted(self, keys):
+        if self.on_evict is not None:
+            for key in keys:
+                self.on_evict(key)
+
+
+class MatchCache:
+    """
+    按用户缓存排好序的匹配推荐列表
+    同时记录每个候选人出现在哪些用户的缓存中，资料变化时可以一并失效
+    反向索引只保留存储中仍在的条目：存储有 on_evict 属性时（如 LRUCacheStore），
+    条目被淘汰或过期后同时从索引中移除，索引大小不超过缓存容量
+    """
+
+    def __init__(self, store=None, max_size=10000, ttl=300):
+        self.store = store if store is not None else LRUCacheStore(max_size=max_size, ttl=ttl)
+        if hasattr(self.store, 'on_evict'):
+            self.store.on_evict = self._evicted
+        self._viewers_by_candidate = {}
+        self._candidates_by_viewer = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """返回缓存的推荐列表，未命中或已过期时返回 None"""
+        matches = self.store.get(user_id)
+        if matches is None:
+            # 没有淘汰通知的存储中条目可能已过期，顺便清理反向索引
+            with self._lock:
+                self._forget_viewer(user_id)
+        return matches
+
+    def set(self, user_id, matches):
+        """缓存 user_id 的推荐列表，matches 为包含 user_id 字段的字典列表"""
+        candidate_ids = {match['user_id'] for match in matches}
+
+        with self._lock:
+            self._forget_viewer(user_id)
+            self._candidates_by_viewer[user_id] = candidate_ids
+            for candidate_id in candidate_ids:
+                self._viewers_by_candidate.setdefault(candidate_id, set()).add(user_id)
+
+        self.store.set(user_id, matches)
+
+    def invalidate(self, user_id):
+        """清除 user_id 自己的缓存，以及所有推荐列表中包含 user_id 的缓存（已淘汰的条目不在索引中）"""
+        with self._lock:
+            viewer_ids = self._viewers_by_candidate.pop(user_id, set())
+            viewer_ids.add(user_id)
+            for viewer_id in viewer_ids:
+                self._forget_viewer(viewer_id)
+
+        for viewer_id in viewer_ids:
+            self.store.delete(viewer_id)
+
+    def drop(self, user_id):
+        """只清除 user_id 自己的推荐列表，例如发出或收到匹配请求后对方不应再出现在推荐中"""
+        with self._lock:
+            self._forget_viewer(user_id)
+        self.store.delete(user_id)
+
+    def clear(self):
+        """清除所有推荐列表；按反向索引逐个 delete，只依赖存储的 get/set/delete"""
+        with self._lock:
+            viewer_ids = list(self._candidates_by_viewer)
+            self._viewers_by_candidate.clear()
+            self._candidates_by_viewer.clear()
+
+        for viewer_id in viewer_ids:
+            self.store.delete(viewer_id)
+
+    def _evicted(self, viewer_id):
+        """存储淘汰或过期了 viewer_id 的条目，从反向索引中移除"""
+        with self._lock:
+            self._forget_viewer(viewer_id)
+
+    def _forget_viewer(self, viewer_id):
+        """移除 viewer_id 在反向索引中的记录（调用方需持有锁）"""
+        for candidate_id in self._candidates_by_viewer.pop(viewer_id, ()):
+            viewers = self._viewers_by_candidate.get(candidate_id)
+            if viewers is not None:
+                viewers.discard(viewer_id)
+                if not viewers:
+                    del self._viewers_by_candidate[candidate_id]
+
+
+class PendingRequestCounts:
+    """
+    每个用户待处理的匹配请求数
+    首次读取时用 loader(user_id) 从数据库统计一次，之后随发送、接受和拒绝增量更新，页面展示不再统计
+    过期时间用来兜底纠正其他进程（如 Streamlit 前端）的修改
+    """
+
+    def __init__(self, loader, store=None, max_size=100000, ttl=600):
+        self.loader = loader
+        self.store = store if store is not None else LRUCacheStore(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        count = self.store.get(user_id)
+        if count is None:
+            count = self.loader(user_id)
+            self.store.set(user_id, count)
+        return count
+
+    def add(self, user_id, delta):
+        """在缓存的计数上加 delta 并返回新值；没有缓存时从数据库统计（调用方需在提交后调用）"""
+        with self._lock:
+            count = self.store.get(user_id)
+            if count is not None:
+                count = max(0, count + delta)
+                self.store.set(user_id, count)
+                return count
+        return self.get(user_id)
@@ -1,82 +1,120 @@
-# utils/matching_algorithm.py
-from models.user import UserProfile
-from utils.geolocation import calculate_distance
-
-
-def find_potential_matches(user, virtual_partner=False, max_results=20):
-    """
-    根据用户信息寻找潜在匹配对象
-    """
-    user_profile = user.profile
-
-    # 排除已经匹配或发送过请求的用户
-    existing_matches_user_ids = [m.matched_user_id for m in user.sent_matches if m.status != 'rejected']
-    existing_matches_user_ids.extend([m.user_id for m in user.received_matches if m.status != 'rejected'])
-
-    # 查询潜在匹配用户
-    query = UserProfile.query.filter(
-        UserProfile.user_id != user.id,
-        UserProfile.user_id.notin_(existing_matches_user_ids),
-        UserProfile.profile_visible == True
-    )
-
-    potential_profiles = query.limit(max_results).all()
-
-    matches_with_score = []
-    for profile in potential_profiles:
-        score = calculate_match_score(user_profile, profile)
-
-        match_data = profile.to_dict()
-        match_data['match_score'] = score
-
-        # 计算距离（如果位置可见）
-        if (user_profile.latitude and user_profile.longitude and
-                profile.latitude and profile.longitude):
-            distance = calculate_distance(
-                user_profile.latitude, user_profile.longitude,
-                profile.latitude, profile.longitude
-            )
-            match_data['distance'] = round(distance, 2)
-
-        matches_with_score.append(match_data)
-
-    # 按匹配度排序
-    matches_with_score.sort(key=lambda x: x['match_score'], reverse=True)
-    return matches_with_score
-
-
-def calculate_match_score(profile1, profile2):
-    """
-    计算两个用户资料的匹配度
-    """
-    score = 0
-
-    # 年龄匹配（年龄差越小分数越高）
-    if profile1.age and profile2.age:
-        age_diff = abs(profile1.age - profile2.age)
-        if age_diff <= 5:
-            score += 30
-        elif age_diff <= 10:
-            score += 20
-        elif age_diff <= 15:
-            score += 10
-
-    # 地理位置匹配（距离越近分数越高）
-    if (profile1.latitude and profile1.longitude and
-            profile2.latitude and profile2.longitude):
-        distance = calculate_distance(
-            profile1.latitude, profile1.longitude,
-            profile2.latitude, profile2.longitude
-        )
-        if distance <= 10:  # 10公里内
-            score += 40
-        elif distance <= 50:  # 50公里内
-            score += 20
-        elif distance <= 100:  # 100公里内
-            score += 10
-
-    # 确保基础分
-    if score == 0:
-        score = 20  # 基础匹配分
-
-    return min(score, 100)
\ No newline at end of file
+# utils/matching_algorithm.py
+from heapq import nsmallest
+from itertools import islice
+
+import numpy as np
+
+from geolocation import calculate_distance, calculate_distances
+
+# 流式读取候选人时每批的行数
+MATCH_BATCH_SIZE = 500
+
+
+def rank_top_matches(user_profile, profiles, max_results, batch_size=MATCH_BATCH_SIZE, after=None):
+    """
+    对候选人逐批打分，只保留分数最高的 max_results 个
+    profiles 可以是任意可迭代对象（如 query.yield_per），不会一次性载入内存
+    返回按 (匹配度从高到低, user_id 升序) 排序的 (score, distance, profile) 列表
+    after 为上一页最后一项的 (score, user_id) 时只返回排在它之后的候选人，用于分页
+    """
+    if max_results <= 0:
+        return []
+
+    scored = score_batches(user_profile, profiles, batch_size)
+    if after is not None:
+        after_key = (-after[0], after[1])
+        scored = (entry for entry in scored if (-entry[0], entry[2].user_id) > after_key)
+
+    # nsmallest 内部维护大小为 max_results 的堆，按排序键流式筛选
+    return nsmallest(max_results, scored, key=lambda entry: (-entry[0], entry[2].user_id))
+
+
+def score_batches(user_profile, profiles, batch_size=MATCH_BATCH_SIZE):
+    """逐批计算距离和匹配度，依次产出 (score, distance, profile)"""
+    profiles = iter(profiles)
+    while True:
+        batch = list(islice(profiles, batch_size))
+        if not batch:
+            break
+
+        latitudes = [p.latitude for p in batch]
+        longitudes = [p.longitude for p in batch]
+        distances = calculate_distances(user_profile.latitude, user_profile.longitude, latitudes, longitudes)
+        scores = calculate_match_scores(user_profile, [p.age for p in batch], latitudes, longitudes,
+                                        distances=distances)
+
+        yield from zip(scores.tolist(), distances.tolist(), batch)
+
+
+def calculate_match_score(profile1, profile2, distance=None):
+    """
+    计算两个用户资料的匹配度
+    distance 可传入已批量计算好的距离，避免重复计算
+    """
+    score = 0
+
+    # 年龄匹配（年龄差越小分数越高）
+    if profile1.age and profile2.age:
+        age_diff = abs(profile1.age - profile2.age)
+        if age_diff <= 5:
+            score += 30
+        elif age_diff <= 10:
+            score += 20
+        elif age_diff <= 15:
+            score += 10
+
+    # 地理位置匹配（距离越近分数越高）
+    if (profile1.latitude and profile1.longitude and
+            profile2.latitude and profile2.longitude):
+        if distance is None:
+            distance = calculate_distance(
+                profile1.latitude, profile1.longitude,
+                profile2.latitude, profile2.longitude
+            )
+        if distance <= 10:  # 10公里内
+            score += 40
+        elif distance <= 50:  # 50公里内
+            score += 20
+        elif distance <= 100:  # 100公里内
+            score += 10
+
+    # 确保基础分
+    if score == 0:
+        score = 20  # 基础匹配分
+
+    return min(score, 100)
+
+
+def calculate_match_scores(profile, ages, latitudes, longitudes, distances=None):
+    """
+    批量计算 profile 与多个候选人的匹配度，规则与 calculate_match_score 完全一致
+    ages / latitudes / longitudes 为候选人的数组，None 或 nan 表示未设置，返回整数数组
+    distances 可传入已批量计算好的距离
+    """
+    ages = np.asarray(ages, dtype=np.float64)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    scores = np.zeros(ages.shape, dtype=np.int64)
+
+    # 年龄匹配（年龄差越小分数越高），年龄为0或未设置时不加分
+    if profile.age:
+        has_age = np.isfinite(ages) & (ages != 0)
+        age_diff = np.abs(np.where(has_age, ages, 0) - profile.age)
+        scores += np.select(
+            [has_age & (age_diff <= 5), has_age & (age_diff <= 10), has_age & (age_diff <= 15)],
+            [30, 20, 10], 0
+        )
+
+    # 地理位置匹配（距离越近分数越高），经纬度为0或未设置时不加分
+    if profile.latitude and profile.longitude:
+        if distances is None:
+            distances = calculate_distances(profile.latitude, profile.longitude, latitudes, longitudes)
+        has_location = (np.isfinite(latitudes) & np.isfinite(longitudes) &
+                        (latitudes != 0) & (longitudes != 0))
+        distances = np.where(has_location, distances, np.inf)
+        scores += np.select([distances <= 10, distances <= 50, distances <= 100], [40, 20, 10], 0)
+
+    # 确保基础分
+    scores[scores == 0] = 20
+
+    return np.minimum(scores, 100)
@@ -0,0 +1,80 @@
+# message_broker.py
+import queue
+import threading
+
+
+class Subscription:
+    """
+    一个长连接的订阅，事件放在有界队列中
+    消费太慢、队列满时标记为溢出，由调用方断开连接，客户端重连后从数据库补齐
+    """
+
+    def __init__(self, broker, channel, max_queue):
+        self.broker = broker
+        self.channel = channel
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=max_queue)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """等待下一个事件，超时返回 None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class MessageBroker:
+    """
+    进程内的发布/订阅，频道为用户ID，同一用户打开的多个页面各有一个订阅
+    发布时只投递给该用户当前打开的连接，客户端不需要轮询数据库
+    等待中的连接只占一个阻塞在队列上的线程（gevent 等协程 worker 下是一个协程），不占数据库连接
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = {}  # channel -> {Subscription}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, event):
+        """把事件投递给频道的所有订阅，返回投递的连接数"""
+        with self._lock:
+            subscriptions = list(self._subscribers.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+        return len(subscriptions)
+
+    def subscriber_count(self, channel=None):
+        """指定频道（或全部频道）当前打开的连接数"""
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
@@ -0,0 +1,51 @@
+# pagination.py
+import base64
+import json
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(sort_value, user_id):
+    """把上一页最后一项的 (排序值, user_id) 编码为不透明的游标字符串"""
+    payload = json.dumps([sort_value, user_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (排序值, user_id)，格式不对时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, user_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('无效的分页游标') from e
+
+    if isinstance(sort_value, bool) or not isinstance(sort_value, (int, float)) or not isinstance(user_id, str):
+        raise ValueError('无效的分页游标')
+    return sort_value, user_id
+
+
+def parse_positive_number(value, default, maximum, cast=int):
+    """解析查询参数中的正数（如每页条数、半径），为空时取默认值，超过上限时取上限"""
+    if value in (None, ''):
+        return default
+    try:
+        number = cast(value)
+    except ValueError as e:
+        raise ValueError(f'参数格式错误: {value}') from e
+    if not number > 0:
+        raise ValueError(f'参数必须大于0: {value}')
+    return min(number, maximum)
+
+
+def datetime_to_sort_value(value):
+    """时间转换为游标中的排序值（自 1970 年起的微秒数），往返转换后与数据库中的值完全相等"""
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def sort_value_to_datetime(sort_value):
+    """游标中的排序值转换回时间，超出范围时抛出 ValueError"""
+    try:
+        return EPOCH + timedelta(microseconds=int(sort_value))
+    except (OverflowError, ValueError) as e:
+        raise ValueError('无效的分页游标') from e
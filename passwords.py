@@ -0,0 +1,52 @@
+# passwords.py
+import hashlib
+import hmac
+import re
+import threading
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Werkzeug 当前默认的算法和参数
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+# 旧版 Streamlit 前端使用的无盐 SHA-256 十六进制摘要
+LEGACY_SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ThrottledPasswordHasher:
+    """
+    统一的密码哈希：算法和成本参数可配置，旧参数或旧格式的哈希在登录成功后可以透明升级
+    这是并发限制器而不是线程池：hash / verify 仍在调用线程中同步计算，调用方照常阻塞到计算完成，
+    信号量只限制同时进行的高成本计算数，超出上限的请求排队等待，
+    避免登录高峰时 CPU 和内存（scrypt）被哈希计算占满
+    hashlib 的 scrypt/pbkdf2 计算期间会释放 GIL，不会阻塞其他请求线程
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, max_concurrent=4):
+        self.method = method
+        # 生成一次哈希得到补全默认参数后的方法名，例如 'pbkdf2' -> 'pbkdf2:sha256:1000000'
+        self.method_prefix = generate_password_hash('', method).split('$', 1)[0]
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def hash(self, password):
+        """生成密码哈希，同时进行的计算达到上限时等待"""
+        with self._slots:
+            return generate_password_hash(password, self.method)
+
+    def verify(self, stored_hash, password):
+        """校验密码，同时进行的计算达到上限时等待"""
+        if not stored_hash or password is None:
+            return False
+        with self._slots:
+            return self._verify(stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """哈希使用的算法或成本参数与当前配置不一致时返回 True"""
+        return stored_hash.split('$', 1)[0] != self.method_prefix
+
+    @staticmethod
+    def _verify(stored_hash, password):
+        if LEGACY_SHA256_PATTERN.match(stored_hash):
+            digest = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(digest, stored_hash)
+        return check_password_hash(stored_hash, password)
@@ -0,0 +1,226 @@
+# profile_store.py
+import threading
+import time
+from datetime import datetime, timedelta
+from heapq import nsmallest
+
+import numpy as np
+
+from geolocation import bounding_box, calculate_distances
+from matching_algorithm import calculate_match_scores
+
+# 增量刷新时向前多取的时间，覆盖 updated_at 早于提交时间的事务
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+class ProfileStore:
+    """
+    按列存放在内存中的用户资料（年龄、经纬度、可见性），用于打分和附近的人筛选
+    只保存计算需要的字段，最终返回的一页结果再从数据库加载完整资料
+
+    loader(since) 返回 (user_id, age, latitude, longitude, profile_visible, location_visible) 行，
+    since 为 None 时返回全部资料，否则只返回 updated_at >= since 的资料
+    同一进程内的修改通过 upsert 立即生效，其他进程的修改每 refresh_interval 秒增量同步一次
+    增量同步的起点是上次同步开始的时间（now()，与写入 updated_at 的时钟相同）减去 REFRESH_OVERLAP，
+    与本进程 upsert 的资料无关，其他进程较早提交的修改不会被跳过
+    """
+
+    def __init__(self, loader, refresh_interval=30, clock=time.monotonic, now=datetime.utcnow):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.now = now
+        self._lock = threading.RLock()
+        self._index = {}  # user_id -> 行号
+        self._size = 0
+        self._allocate(0)
+        self._loaded = False
+        self._last_refresh = None
+        self._synced_at = None  # 上次同步开始的时间，下次从这之前 REFRESH_OVERLAP 开始增量加载
+
+    def __len__(self):
+        return self._size
+
+    def load(self):
+        """从数据库重新加载全部资料"""
+        with self._lock:
+            self._index = {}
+            self._size = 0
+            self._allocate(0)
+            started_at = self.now()
+            self._apply(self.loader(None))
+            self._synced_at = started_at
+            self._loaded = True
+            self._last_refresh = self.clock()
+
+    def refresh(self, force=False):
+        """距离上次同步超过 refresh_interval 秒时，加载这段时间内有变化的资料"""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+                return
+            if not force and self.clock() - self._last_refresh < self.refresh_interval:
+                return
+
+            started_at = self.now()
+            self._apply(self.loader(self._synced_at - REFRESH_OVERLAP))
+            self._synced_at = started_at
+            self._last_refresh = self.clock()
+
+    def upsert(self, user_id, age, latitude, longitude, profile_visible, location_visible):
+        """新增或更新一个用户的资料"""
+        with self._lock:
+            row = self._index.get(user_id)
+            if row is None:
+                if self._size == len(self._user_ids):
+                    self._allocate(max(1024, self._size * 2))
+                row = self._size
+                self._index[user_id] = row
+                self._user_ids[row] = user_id
+                self._size += 1
+
+            self._ages[row] = age if age is not None else np.nan
+            self._latitudes[row] = latitude if latitude is not None else np.nan
+            self._longitudes[row] = longitude if longitude is not None else np.nan
+            self._profile_visible[row] = bool(profile_visible)
+            self._location_visible[row] = bool(location_visible)
+
+    def upsert_profile(self, profile):
+        """用 UserProfile 对象更新资料"""
+        self.upsert(profile.user_id, profile.age, profile.latitude, profile.longitude,
+                    profile.profile_visible, profile.location_visible)
+
+    def nearby(self, user_id, latitude, longitude, radius_km, limit, after=None):
+        """
+        返回 radius_km 范围内资料和位置都公开的用户，按 (距离, user_id) 升序的前 limit 个
+        after 为上一页最后一项的 (distance, user_id)，返回 [(distance, user_id), ...]
+        """
+        self.refresh()
+        with self._lock:
+            mask = self._profile_visible[:self._size] & self._location_visible[:self._size]
+            mask &= self._bounding_box_mask(latitude, longitude, radius_km)
+            self._exclude(mask, (user_id,))
+            rows = np.flatnonzero(mask)
+            user_ids = self._user_ids[rows]
+            latitudes = self._latitudes[rows]
+            longitudes = self._longitudes[rows]
+
+        distances = calculate_distances(latitude, longitude, latitudes, longitudes)
+        keep = distances <= radius_km
+        if after is not None:
+            after_distance, after_user_id = after
+            keep &= (distances > after_distance) | ((distances == after_distance) & (user_ids > after_user_id))
+
+        distances, user_ids = distances[keep], user_ids[keep]
+        if len(distances) > limit:
+            # 先按距离取出前 limit 个（含并列），再按 (距离, user_id) 精确排序
+            threshold = np.partition(distances, limit - 1)[limit - 1]
+            within = distances <= threshold
+            distances, user_ids = distances[within], user_ids[within]
+
+        return sorted(zip(distances.tolist(), user_ids.tolist()))[:limit]
+
+    def top_matches(self, user_profile, max_results, radius_km=None, after=None, exclude=None):
+        """
+        在资料公开的用户中找出与 user_profile 匹配度最高的 max_results 个
+        指定 radius_km 且用户有位置时，先用经纬度矩形粗筛，再按精确距离只保留 radius_km 以内的候选人
+        （与附近的人和离线推荐的范围一致）
+        exclude(user_ids) 返回给定候选人中需要跳过的用户（如已有匹配关系的），只对排名靠前的候选人调用，
+        排除的人多时成倍扩大范围再取，不需要事先加载用户的全部排除名单
+        返回 [(score, distance, user_id), ...]，排序和 after 游标与 rank_top_matches 相同
+        打分用 calculate_match_scores 在整列上批量计算
+        """
+        if max_results <= 0:
+            return []
+
+        self.refresh()
+        with self._lock:
+            mask = self._profile_visible[:self._size].copy()
+            if radius_km and user_profile.latitude and user_profile.longitude:
+                mask &= self._bounding_box_mask(user_profile.latitude, user_profile.longitude, radius_km)
+            self._exclude(mask, (user_profile.user_id,))
+            rows = np.flatnonzero(mask)
+            user_ids = self._user_ids[rows]
+            ages = self._ages[rows]
+            latitudes = self._latitudes[rows]
+            longitudes = self._longitudes[rows]
+
+        distances = calculate_distances(user_profile.latitude, user_profile.longitude, latitudes, longitudes)
+        if radius_km and user_profile.latitude and user_profile.longitude:
+            within = distances <= radius_km
+            user_ids, ages, latitudes, longitudes, distances = (
+                user_ids[within], ages[within], latitudes[within], longitudes[within], distances[within])
+        scores = calculate_match_scores(user_profile, ages, latitudes, longitudes, distances=distances)
+        if after is not None:
+            after_score, after_user_id = after
+            keep = (scores < after_score) | ((scores == after_score) & (user_ids > after_user_id))
+            scores, distances, user_ids = scores[keep], distances[keep], user_ids[keep]
+
+        wanted = max_results
+        while True:
+            ranked = self._rank(scores, distances, user_ids, wanted)
+            excluded = exclude([user_id for _, _, user_id in ranked]) if exclude and ranked else ()
+            results = [entry for entry in ranked if entry[2] not in excluded]
+            if len(results) >= max_results or len(ranked) < wanted:
+                return results[:max_results]
+            wanted = wanted * 2 + len(excluded)
+
+    @staticmethod
+    def _rank(scores, distances, user_ids, max_results):
+        """按 (匹配度从高到低, user_id 升序) 取前 max_results 个，返回 [(score, distance, user_id), ...]"""
+        selected = np.arange(len(scores))
+        if len(scores) > max_results:
+            # 分数只有少数几档，先取出高于第 max_results 名分数的，同分的再按 user_id 补足
+            threshold = np.partition(scores, len(scores) - max_results)[len(scores) - max_results]
+            above = np.flatnonzero(scores > threshold)
+            ties = np.flatnonzero(scores == threshold)
+            selected = np.concatenate([
+                above,
+                np.array(nsmallest(max_results - len(above), ties.tolist(), key=user_ids.__getitem__),
+                         dtype=np.intp),
+            ])
+
+        ranked = sorted(zip((-scores[selected]).tolist(), user_ids[selected].tolist(),
+                            distances[selected].tolist()))
+        return [(-negative_score, distance, user_id) for negative_score, user_id, distance in ranked]
+
+    def _apply(self, rows):
+        for user_id, age, latitude, longitude, profile_visible, location_visible in rows:
+            self.upsert(user_id, age, latitude, longitude, profile_visible, location_visible)
+
+    def _allocate(self, capacity):
+        """扩容各列数组，保留已有数据（调用方需持有锁）"""
+        def grow(column, dtype, fill):
+            new = np.full(capacity, fill, dtype=dtype)
+            if column is not None:
+                new[:self._size] = column[:self._size]
+            return new
+
+        self._user_ids = grow(getattr(self, '_user_ids', None), object, None)
+        self._ages = grow(getattr(self, '_ages', None), np.float64, np.nan)
+        self._latitudes = grow(getattr(self, '_latitudes', None), np.float64, np.nan)
+        self._longitudes = grow(getattr(self, '_longitudes', None), np.float64, np.nan)
+        self._profile_visible = grow(getattr(self, '_profile_visible', None), bool, False)
+        self._location_visible = grow(getattr(self, '_location_visible', None), bool, False)
+
+    def _bounding_box_mask(self, latitude, longitude, radius_km):
+        """经纬度矩形范围的粗筛（geolocation.bounding_box），跨越180度经线时拆成两段（调用方需持有锁）"""
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+        latitudes = self._latitudes[:self._size]
+        longitudes = self._longitudes[:self._size]
+        with np.errstate(invalid='ignore'):
+            mask = (latitudes >= min_lat) & (latitudes <= max_lat)
+            if max_lon - min_lon >= 360:
+                return mask
+            if min_lon < -180:
+                # 跨越180度经线时拆成两段
+                return mask & ((longitudes >= min_lon + 360) | (longitudes <= max_lon))
+            if max_lon > 180:
+                return mask & ((longitudes >= min_lon) | (longitudes <= max_lon - 360))
+            return mask & (longitudes >= min_lon) & (longitudes <= max_lon)
+
+    def _exclude(self, mask, user_ids):
+        """在 mask 中去掉指定用户（调用方需持有锁）"""
+        rows = [self._index[user_id] for user_id in user_ids if user_id in self._index]
+        if rows:
+            mask[rows] = False
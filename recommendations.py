@@ -0,0 +1,137 @@
+# recommendations.py
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from geolocation import calculate_distance, calculate_distances, geohash_bounds, geohash_cells
+from matching_algorithm import calculate_match_score, rank_top_matches
+
+# 离线计算使用的轻量资料行，字段与 calculate_match_score 用到的属性一致
+ProfileRow = namedtuple('ProfileRow', 'user_id age latitude longitude geohash profile_visible')
+
+# 按 geohash 前缀划分邻域的精度（3位约 156km x 156km）
+NEIGHBORHOOD_PRECISION = 3
+
+
+def has_location(row):
+    """与在线匹配一致：经纬度任一为空或为0都视为没有位置"""
+    return bool(row.latitude and row.longitude and row.geohash)
+
+
+def neighborhood_key(row):
+    """返回资料所属的邻域，没有位置的用户归为 None"""
+    return row.geohash[:NEIGHBORHOOD_PRECISION] if has_location(row) else None
+
+
+def neighborhood_cells(key, radius_km):
+    """
+    返回邻域内任一用户在 radius_km 范围内的候选人可能落入的 geohash 单元
+    以单元中心为圆心，半径加上单元半对角线
+    """
+    min_lat, max_lat, min_lon, max_lon = geohash_bounds(key)
+    center_lat = (min_lat + max_lat) / 2
+    center_lon = (min_lon + max_lon) / 2
+    half_diagonal = max(calculate_distance(center_lat, center_lon, lat, lon)
+                        for lat in (min_lat, max_lat) for lon in (min_lon, max_lon))
+    return geohash_cells(center_lat, center_lon, radius_km + half_diagonal)
+
+
+def build_neighborhoods(rows, radius_km, changed_user_ids=None, stale_viewer_ids=(), score_floors=None):
+    """
+    将用户按邻域分组，并为每组找出候选人
+    changed_user_ids 不为 None 时只返回受这些用户变化影响的用户：
+      - 变化用户所在及覆盖到变化用户的邻域整组重算
+      - stale_viewer_ids（现有推荐里有变化用户的人，例如变化用户搬走前的邻居）单独重算
+      - 没有位置的用户只重算自己有变化的、在 stale_viewer_ids 中的，
+        以及变化的可见用户分数不低于其推荐最低分（score_floors，推荐不满的不在其中）的
+    返回 [(viewers, candidates), ...]
+    """
+    viewers_by_key = defaultdict(list)
+    for row in rows:
+        viewers_by_key[neighborhood_key(row)].append(row)
+
+    candidates = [row for row in rows if row.profile_visible]
+    located_candidates = [row for row in candidates if has_location(row)]
+    prefix_indexes = {}
+
+    def candidates_in(cells):
+        found = []
+        for cell in cells:
+            index = prefix_indexes.get(len(cell))
+            if index is None:
+                index = defaultdict(list)
+                for row in located_candidates:
+                    index[row.geohash[:len(cell)]].append(row)
+                prefix_indexes[len(cell)] = index
+            found.extend(index.get(cell, ()))
+        return found
+
+    changed_rows = None
+    if changed_user_ids is not None:
+        changed_rows = [row for row in rows if row.user_id in changed_user_ids]
+        changed_candidates = [row for row in changed_rows if row.profile_visible]
+        score_floors = score_floors or {}
+
+    def may_enter(viewer):
+        """变化的可见用户是否可能进入没有位置的用户的推荐"""
+        floor = score_floors.get(viewer.user_id)
+        return any(
+            row.user_id != viewer.user_id and (floor is None or calculate_match_score(viewer, row) >= floor)
+            for row in changed_candidates
+        )
+
+    groups = []
+    for key, viewers in viewers_by_key.items():
+        if key is None:
+            # 没有位置的用户和在线匹配一样在所有可见用户中挑选
+            group_candidates = candidates
+            if changed_rows is not None:
+                viewers = [viewer for viewer in viewers if viewer.user_id in changed_user_ids or
+                           viewer.user_id in stale_viewer_ids or may_enter(viewer)]
+        else:
+            cells = neighborhood_cells(key, radius_km)
+            group_candidates = candidates_in(cells)
+            affected = changed_rows is None or any(
+                neighborhood_key(row) == key or
+                (has_location(row) and row.geohash.startswith(tuple(cells)))
+                for row in changed_rows
+            )
+            if not affected:
+                viewers = [viewer for viewer in viewers if viewer.user_id in stale_viewer_ids]
+
+        if viewers:
+            groups.append((viewers, group_candidates))
+
+    return groups
+
+
+def score_neighborhood(task):
+    """
+    进程池工作函数：为一组用户计算推荐
+    task 为 (viewers, candidates, top_n, radius_km)，返回 recommendations 表的行
+    """
+    viewers, candidates, top_n, radius_km = task
+    latitudes = np.array([c.latitude if c.latitude is not None else np.nan for c in candidates],
+                         dtype=np.float64)
+    longitudes = np.array([c.longitude if c.longitude is not None else np.nan for c in candidates],
+                          dtype=np.float64)
+
+    rows = []
+    for viewer in viewers:
+        pool = candidates
+        if radius_km and viewer.latitude and viewer.longitude:
+            distances = calculate_distances(viewer.latitude, viewer.longitude, latitudes, longitudes)
+            pool = [candidates[i] for i in np.flatnonzero(distances <= radius_km)]
+
+        pool = [c for c in pool if c.user_id != viewer.user_id]
+        ranked = rank_top_matches(viewer, pool, top_n)
+        for rank, (score, distance, candidate) in enumerate(ranked, start=1):
+            rows.append({
+                'user_id': viewer.user_id,
+                'recommended_user_id': candidate.user_id,
+                'rank': rank,
+                'match_score': score,
+                'distance': round(distance, 2) if distance != float('inf') else None,
+            })
+
+    return rows
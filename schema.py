@@ -0,0 +1,73 @@
+# schema.py
+from sqlalchemy import event, func, inspect, select, text
+
+# 已经没有查询使用、从模型中删除的索引，升级时从已有数据库中删掉，省去写入时的维护开销
+DROPPED_INDEXES = {
+    'user_profiles': ('ix_user_profiles_lat_lon', 'ix_user_profiles_visibility', 'ix_user_profiles_geohash',
+                      'ix_user_profiles_visible_geohash'),
+}
+
+
+def configure_sqlite(engine, pragmas):
+    """为引擎的每个新连接设置SQLite PRAGMA（WAL、同步级别、忙等待、内存映射和页缓存）"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def upgrade_schema(engine, metadata):
+    """
+    按 metadata 为已有数据库补齐新增的表、列和索引（create_all 不会修改已存在的表）
+    只做 CREATE TABLE / ADD COLUMN / CREATE INDEX 和删除 DROPPED_INDEXES 中的索引，
+    不会删除或改写已有数据（已有数据违反唯一索引时跳过该索引），返回执行的变更列表
+    Flask 端和 Streamlit 端共用这份实现
+    """
+    changes = []
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                table.create(conn)
+                changes.append(f'CREATE TABLE {table.name}')
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    changes.append(f'ADD COLUMN {table.name}.{column.name}')
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    if index.unique and has_duplicates(conn, table, index):
+                        print(f"❌ 未创建唯一索引 {index.name}：{table.name} 中已有重复数据，清理后请重新升级")
+                        continue
+                    index.create(conn)
+                    changes.append(f'CREATE INDEX {index.name}')
+            for name in DROPPED_INDEXES.get(table.name, ()):
+                if name in existing_indexes:
+                    conn.execute(text(f'DROP INDEX {name}'))
+                    changes.append(f'DROP INDEX {name}')
+
+        if changes:
+            # 更新统计信息，让查询规划器使用新索引
+            conn.execute(text('ANALYZE'))
+
+    return changes
+
+
+def has_duplicates(conn, table, index):
+    """已有数据中是否存在违反唯一索引 index 的重复行"""
+    columns = list(index.columns)
+    duplicate = select(*columns).select_from(table).group_by(*columns).having(func.count() > 1).limit(1)
+    return conn.execute(duplicate).first() is not None
@@ -0,0 +1,183 @@
+# streamlit_storage.py
+import threading
+import uuid
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, or_, select
+
+from config import Config
+from interest_index import interests_to_mask, mask_to_interests
+from schema import configure_sqlite, upgrade_schema
+from user import Match, User, UserProfile, db
+
+users_table = User.__table__
+profiles_table = UserProfile.__table__
+matches_table = Match.__table__
+
+# Streamlit 页面用到的资料字段
+PROFILE_COLUMNS = (
+    profiles_table.c.user_id, profiles_table.c.full_name, profiles_table.c.age, profiles_table.c.gender,
+    profiles_table.c.bio, profiles_table.c.city, profiles_table.c.interests_mask,
+    profiles_table.c.latitude, profiles_table.c.longitude,
+)
+
+# IN 查询每批的参数个数，低于 SQLite 的变量数上限
+IN_BATCH_SIZE = 500
+
+
+def create_storage_engine(database_uri=None, pragmas=None):
+    """创建数据库引擎，默认与 Flask 端使用同一个数据库，并补齐缺少的表、列和索引"""
+    engine = create_engine(database_uri or Config.SQLALCHEMY_DATABASE_URI)
+    configure_sqlite(engine, Config.SQLITE_PRAGMAS if pragmas is None else pragmas)
+    upgrade_schema(engine, db.metadata)
+    return engine
+
+
+def profile_to_dict(row):
+    """数据库行转换为页面使用的资料字典，兴趣位集展开为列表"""
+    profile = dict(row._mapping)
+    profile['interests'] = mask_to_interests(profile.pop('interests_mask') or 0)
+    return profile
+
+
+class StreamlitStorage:
+    """
+    Streamlit 前端的共享存储，所有会话通过同一个引擎（连接池）访问同一份数据
+    用户名、邮箱和 user_id 的查询都走唯一约束或索引，不再遍历全部用户
+    profiles_version 在本进程新增用户或修改资料时加一，页面用它作为匹配和附近的人缓存的键
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.profiles_version = 0
+        self._version_lock = threading.Lock()
+
+    def bump_profiles_version(self):
+        with self._version_lock:
+            self.profiles_version += 1
+
+    def count_users(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(users_table)).scalar_one()
+
+    def get_user_by_username(self, username):
+        with self.engine.connect() as conn:
+            row = conn.execute(select(users_table).where(users_table.c.username == username)).first()
+        return dict(row._mapping) if row else None
+
+    def find_conflicts(self, username, email):
+        """一次查询检查用户名和邮箱是否已被使用，返回 (用户名已存在, 邮箱已被注册)"""
+        query = select(users_table.c.username, users_table.c.email).where(
+            or_(users_table.c.username == username, users_table.c.email == email)
+        )
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).all()
+        return any(row.username == username for row in rows), any(row.email == email for row in rows)
+
+    def create_user(self, username, email, password_hash, profile=None):
+        """在同一个事务中创建用户和个人资料，用户名或邮箱重复时抛出 IntegrityError"""
+        user_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        profile = dict(profile or {})
+        profile['interests_mask'] = interests_to_mask(profile.pop('interests', ()))
+
+        with self.engine.begin() as conn:
+            conn.execute(users_table.insert().values(
+                id=user_id, username=username, email=email, password_hash=password_hash,
+                created_at=now, last_login=now
+            ))
+            conn.execute(profiles_table.insert().values(
+                id=str(uuid.uuid4()), user_id=user_id, updated_at=now, **profile
+            ))
+        self.bump_profiles_version()
+        return user_id
+
+    def update_password_hash(self, user_id, password_hash):
+        with self.engine.begin() as conn:
+            conn.execute(users_table.update().where(users_table.c.id == user_id)
+                         .values(password_hash=password_hash))
+
+    def get_profile(self, user_id):
+        with self.engine.connect() as conn:
+            row = conn.execute(select(*PROFILE_COLUMNS).where(profiles_table.c.user_id == user_id)).first()
+        return profile_to_dict(row) if row else None
+
+    def get_profiles(self, user_ids):
+        """按 user_id 批量加载资料，返回 {user_id: 资料字典}"""
+        return {row.user_id: profile_to_dict(row) for row in self._select_by_user_ids(PROFILE_COLUMNS, user_ids)}
+
+    def match_fields(self, user_ids):
+        """打分只需要的字段，返回 (user_id, age, city) 行，隐藏资料的用户不参与匹配"""
+        columns = (profiles_table.c.user_id, profiles_table.c.age, profiles_table.c.city)
+        return self._select_by_user_ids(columns, user_ids, profiles_table.c.profile_visible.is_(True))
+
+    def update_profile(self, user_id, **fields):
+        """更新个人资料，interests 转换为位集保存"""
+        if 'interests' in fields:
+            fields['interests_mask'] = interests_to_mask(fields.pop('interests'))
+        with self.engine.begin() as conn:
+            conn.execute(profiles_table.update().where(profiles_table.c.user_id == user_id)
+                         .values(updated_at=datetime.utcnow(), **fields))
+        self.bump_profiles_version()
+
+    def user_ids_in_city(self, city, exclude_user_id):
+        """同城其他用户的 user_id，按最近更新资料排序（city 列有索引），页面按页再加载资料"""
+        query = select(profiles_table.c.user_id).where(
+            profiles_table.c.city == city,
+            profiles_table.c.user_id != exclude_user_id,
+            profiles_table.c.profile_visible.is_(True),
+        ).order_by(profiles_table.c.updated_at.desc(), profiles_table.c.user_id)
+        with self.engine.connect() as conn:
+            return conn.execute(query).scalars().all()
+
+    def interest_masks(self):
+        """所有设置了兴趣的用户，返回 (user_id, interests_mask) 行，用于构建兴趣倒排索引"""
+        query = select(profiles_table.c.user_id, profiles_table.c.interests_mask).where(
+            profiles_table.c.interests_mask != 0
+        )
+        with self.engine.connect() as conn:
+            return conn.execute(query).all()
+
+    def send_match_request(self, user_id, matched_user_id):
+        """发送匹配请求，双方之间已有请求时不重复创建，返回是否新建"""
+        existing = select(matches_table.c.id).where(or_(
+            (matches_table.c.user_id == user_id) & (matches_table.c.matched_user_id == matched_user_id),
+            (matches_table.c.user_id == matched_user_id) & (matches_table.c.matched_user_id == user_id),
+        ))
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            if conn.execute(existing).first():
+                return False
+            conn.execute(matches_table.insert().values(
+                id=str(uuid.uuid4()), user_id=user_id, matched_user_id=matched_user_id,
+                status='pending', created_at=now, updated_at=now
+            ))
+        return True
+
+    def pending_match_requests(self, user_id):
+        """收到的待处理匹配请求，附带发送者的用户名和姓名"""
+        query = (
+            select(matches_table.c.id, users_table.c.username, profiles_table.c.full_name)
+            .join(users_table, users_table.c.id == matches_table.c.user_id)
+            .outerjoin(profiles_table, profiles_table.c.user_id == matches_table.c.user_id)
+            .where(matches_table.c.matched_user_id == user_id, matches_table.c.status == 'pending')
+            .order_by(matches_table.c.created_at)
+        )
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(query)]
+
+    def respond_to_match(self, match_id, user_id, status):
+        """接收者接受或拒绝匹配请求"""
+        with self.engine.begin() as conn:
+            conn.execute(matches_table.update().where(
+                matches_table.c.id == match_id, matches_table.c.matched_user_id == user_id
+            ).values(status=status, updated_at=datetime.utcnow()))
+
+    def _select_by_user_ids(self, columns, user_ids, *criteria):
+        user_ids = list(user_ids)
+        rows = []
+        with self.engine.connect() as conn:
+            for start in range(0, len(user_ids), IN_BATCH_SIZE):
+                batch = user_ids[start:start + IN_BATCH_SIZE]
+                rows.extend(conn.execute(select(*columns).where(profiles_table.c.user_id.in_(batch), *criteria)))
+        return rows
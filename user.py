@@ -1,112 +1,190 @@
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import UserMixin
-from datetime import datetime
-import uuid
-
-db = SQLAlchemy()
-
-
-class User(UserMixin, db.Model):
-    __tablename__ = 'users'
-
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_login = db.Column(db.DateTime, default=datetime.utcnow)
-
-    # 关联个人资料
-    profile = db.relationship('UserProfile', backref='user', uselist=False, cascade='all, delete-orphan')
-    # 发送的匹配请求
-    sent_matches = db.relationship('Match', foreign_keys='Match.user_id', backref='sender', lazy='dynamic')
-    # 接收的匹配请求
-    received_matches = db.relationship('Match', foreign_keys='Match.matched_user_id', backref='receiver',
-                                       lazy='dynamic')
-
-    def __repr__(self):
-        return f'<User {self.username}>'
-
-
-class UserProfile(db.Model):
-    __tablename__ = 'user_profiles'
-
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-
-    # 基本信息
-    full_name = db.Column(db.String(100))
-    age = db.Column(db.Integer)
-    gender = db.Column(db.String(20))
-    bio = db.Column(db.Text)
-
-    # 地理位置
-    latitude = db.Column(db.Float)
-    longitude = db.Column(db.Float)
-    location_visible = db.Column(db.Boolean, default=True)
-
-    # 联系信息
-    phone = db.Column(db.String(20))
-    wechat = db.Column(db.String(50))
-    contact_visible = db.Column(db.Boolean, default=False)
-
-    # 隐私设置
-    profile_visible = db.Column(db.Boolean, default=True)
-
-    # 虚拟恋人偏好
-    virtual_partner_preference = db.Column(db.Text)  # JSON格式存储偏好设置
-
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-    def to_dict(self, include_private=False):
-        """将个人资料转换为字典，根据隐私设置决定是否显示敏感信息"""
-        data = {
-            'id': self.id,
-            'user_id': self.user_id,
-            'full_name': self.full_name,
-            'age': self.age,
-            'gender': self.gender,
-            'bio': self.bio,
-        }
-
-        if include_private or self.profile_visible:
-            # 只有在查看自己资料或对方开放资料时才显示完整信息
-            if include_private or self.location_visible:
-                data.update({
-                    'latitude': self.latitude,
-                    'longitude': self.longitude
-                })
-
-            if include_private or self.contact_visible:
-                data.update({
-                    'phone': self.phone,
-                    'wechat': self.wechat
-                })
-
-        return data
-
-
-class Match(db.Model):
-    __tablename__ = 'matches'
-
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)  # 发送者
-    matched_user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)  # 接收者
-
-    # 匹配状态: pending, accepted, rejected, blocked
-    status = db.Column(db.String(20), default='pending')
-
-    # 联系方式交换
-    contact_exchanged = db.Column(db.Boolean, default=False)
-    contact_exchange_requested = db.Column(db.Boolean, default=False)
-
-    # 虚拟恋人关系
-    is_virtual_partner = db.Column(db.Boolean, default=False)
-    virtual_partner_start = db.Column(db.DateTime)
-    virtual_partner_end = db.Column(db.DateTime)
-
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-    def __repr__(self):
-        return f'<Match {self.user_id} -> {self.matched_user_id}: {self.status}>'
\ No newline at end of file
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import UserMixin
+from datetime import datetime
+import uuid
+
+from geolocation import encode_geohash
+
+db = SQLAlchemy()
+
+
+class User(UserMixin, db.Model):
+    __tablename__ = 'users'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(128), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_login = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # 关联个人资料
+    profile = db.relationship('UserProfile', backref='user', uselist=False, cascade='all, delete-orphan')
+    # 发送的匹配请求
+    sent_matches = db.relationship('Match', foreign_keys='Match.user_id', backref='sender', lazy='dynamic')
+    # 接收的匹配请求
+    received_matches = db.relationship('Match', foreign_keys='Match.matched_user_id', backref='receiver',
+                                       lazy='dynamic')
+
+    def __repr__(self):
+        return f'<User {self.username}>'
+
+
+class UserProfile(db.Model):
+    __tablename__ = 'user_profiles'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+
+    # 基本信息
+    full_name = db.Column(db.String(100))
+    age = db.Column(db.Integer)
+    gender = db.Column(db.String(20))
+    bio = db.Column(db.Text)
+    city = db.Column(db.String(50), index=True)  # Streamlit 前端按城市查找附近的人
+    interests_mask = db.Column(db.Integer, default=0)  # 兴趣位集，见 interest_index.INTERESTS_OPTIONS
+
+    # 地理位置
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    location_visible = db.Column(db.Boolean, default=True)
+    geohash = db.Column(db.String(12))  # 随经纬度更新，离线推荐按前缀划分邻域
+
+    # 联系信息
+    phone = db.Column(db.String(20))
+    wechat = db.Column(db.String(50))
+    contact_visible = db.Column(db.Boolean, default=False)
+
+    # 隐私设置
+    profile_visible = db.Column(db.Boolean, default=True)
+
+    # 虚拟恋人偏好
+    virtual_partner_preference = db.Column(db.Text)  # JSON格式存储偏好设置
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+
+    def update_geohash(self):
+        """根据当前经纬度重新计算geohash"""
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = None
+
+    def to_dict(self, include_private=False):
+        """将个人资料转换为字典，根据隐私设置决定是否显示敏感信息"""
+        data = {
+            'id': self.id,
+            'user_id': self.user_id,
+            'full_name': self.full_name,
+            'age': self.age,
+            'gender': self.gender,
+            'bio': self.bio,
+        }
+
+        if include_private or self.profile_visible:
+            # 只有在查看自己资料或对方开放资料时才显示完整信息
+            if include_private or self.location_visible:
+                data.update({
+                    'latitude': self.latitude,
+                    'longitude': self.longitude
+                })
+
+            if include_private or self.contact_visible:
+                data.update({
+                    'phone': self.phone,
+                    'wechat': self.wechat
+                })
+
+        return data
+
+
+class Match(db.Model):
+    __tablename__ = 'matches'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)  # 发送者
+    matched_user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)  # 接收者
+
+    # 匹配状态: pending, accepted, rejected, blocked
+    status = db.Column(db.String(20), default='pending', index=True)
+
+    # 联系方式交换
+    contact_exchanged = db.Column(db.Boolean, default=False)
+    contact_exchange_requested = db.Column(db.Boolean, default=False)
+
+    # 虚拟恋人关系
+    is_virtual_partner = db.Column(db.Boolean, default=False)
+    virtual_partner_start = db.Column(db.DateTime)
+    virtual_partner_end = db.Column(db.DateTime)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_matches_user_status', 'user_id', 'status'),
+        db.Index('ix_matches_matched_user_status', 'matched_user_id', 'status'),
+        # 同一发送者对同一接收者只有一条记录，被拒绝后重新发送时复用
+        db.Index('ux_matches_pair', 'user_id', 'matched_user_id', unique=True),
+    )
+
+    def __repr__(self):
+        return f'<Match {self.user_id} -> {self.matched_user_id}: {self.status}>'
+
+
+class Recommendation(db.Model):
+    """离线任务预先计算好的匹配推荐"""
+    __tablename__ = 'recommendations'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    recommended_user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+
+    rank = db.Column(db.Integer, nullable=False)  # 从1开始
+    match_score = db.Column(db.Integer, nullable=False)
+    distance = db.Column(db.Float)  # 公里，没有位置时为空
+
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_recommendations_user_rank', 'user_id', 'rank'),
+        db.Index('ix_recommendations_recommended_user', 'recommended_user_id'),  # 增量计算时查找受影响的用户
+    )
+
+    def __repr__(self):
+        return f'<Recommendation {self.user_id} #{self.rank}: {self.recommended_user_id}>'
+
+
+class RecommendationRun(db.Model):
+    """离线推荐任务的运行记录，增量运行时以上次开始时间为界"""
+    __tablename__ = 'recommendation_runs'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    started_at = db.Column(db.DateTime, nullable=False, index=True)
+    finished_at = db.Column(db.DateTime)
+    users_processed = db.Column(db.Integer, default=0)
+
+
+class Message(db.Model):
+    """两个用户之间的私信"""
+    __tablename__ = 'messages'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # 会话ID：双方 user_id 排序后用冒号连接，同一对用户的消息属于同一个会话
+    conversation_id = db.Column(db.String(73), nullable=False)
+    sender_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    recipient_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # 会话内按时间分页
+        db.Index('ix_messages_conversation_created', 'conversation_id', 'created_at', 'id'),
+        # 事件流重连时补发该用户收到和发出的新消息
+        db.Index('ix_messages_recipient_created', 'recipient_id', 'created_at', 'id'),
+        db.Index('ix_messages_sender_created', 'sender_id', 'created_at', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<Message {self.sender_id} -> {self.recipient_id}>'